@@ -10,10 +10,19 @@ from routes import (
     label_routes,
 )
 from config import setup_cors
+from services.chart_renderer import shutdown_renderer_pool
+from utils.http_client import close_http_clients
+from services.model_registry import model_registry, MODEL_WARMUP
+from services.inference_scheduler import inference_scheduler
+from services.label_store import label_store
+from services.detection_cache import detection_cache
+from services.remote_cache import remote_cache
+from services.yolo_service import yolo_service
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
+import threading
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
@@ -57,6 +66,11 @@ os.makedirs("uploads", exist_ok=True)
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# Databases live outside the served uploads directory
+os.makedirs(os.path.dirname(label_store.db_path) or ".", exist_ok=True)
+if detection_cache.db_path:
+    os.makedirs(os.path.dirname(detection_cache.db_path) or ".", exist_ok=True)
+
 # Include Routes
 app.include_router(fileupload_routes.router)
 app.include_router(preprocess_routes.router)
@@ -67,6 +81,28 @@ app.include_router(column_routes.router)
 app.include_router(viz_routes.router)
 app.include_router(label_routes.router, prefix="/label", tags=["label"])
 
+@app.on_event("startup")
+async def warm_up_models():
+    if MODEL_WARMUP:
+        # Load in the background so startup is not held up by the model
+        threading.Thread(target=warm_up_model, name="model-warmup", daemon=True).start()
+
+def warm_up_model():
+    try:
+        inference_scheduler.warm_up()
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    shutdown_renderer_pool()
+    close_http_clients()
+    inference_scheduler.shutdown()
+    yolo_service.shutdown()
+    label_store.close()
+    remote_cache.flush()
+    model_registry.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Datanize API"}
@@ -1,10 +1,14 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 
 class FileUploadResponse(BaseModel):
     filename: str
     status: str
 
+class SheetSelectRequest(BaseModel):
+    file_path: str
+    sheet: Union[int, str] = 0  # Sheet position or name
+
 class PreprocessRequest(BaseModel):
     file_path: str
     method: str  # mean, median, most_frequent
@@ -22,6 +26,19 @@ class VisualizationRequest(BaseModel):
     x_col: str
     y_col: str
     chart_type: str
+    response_format: str = "records"  # records, columnar, arrow
+    compression: Optional[str] = None  # gzip, br
+
+class ChartSpec(BaseModel):
+    x_col: str
+    y_col: str
+    chart_type: str
+
+class ReportRequest(BaseModel):
+    file_path: str
+    charts: List[ChartSpec]
+    format: str = "pptx"  # pptx, pdf
+    title: Optional[str] = None
 
 class ChartData(BaseModel):
     data: List[Dict[str, Any]]
@@ -33,12 +50,19 @@ class SplitDataRequest(BaseModel):
     test_size: float
     random_state: int
     target_column: str
+    output_format: str = "csv"  # csv, csv.gz, parquet
+    mode: str = "files"  # files, index, stream
+    strategy: str = "random"  # random, stratified, group, time, kfold, stratified_kfold, group_kfold
+    group_column: Optional[str] = None  # Required by group and group_kfold
+    time_column: Optional[str] = None  # Required by time
+    n_splits: int = 5  # Number of folds for k-fold strategies
 
 class ExportToPPTRequest(BaseModel):
-    chart_data: List[Dict[str, Any]]
-    chart_type: str
-    x_column: str
-    y_column: str
+    chart_id: Optional[str] = None  # Reference returned by /visualize/, replaces chart_data
+    chart_data: Optional[Union[List[Dict[str, Any]], Dict[str, List[Any]]]] = None  # records or columnar {x, y}
+    chart_type: Optional[str] = None
+    x_column: Optional[str] = None
+    y_column: Optional[str] = None
 
 class Detection(BaseModel):
     label: str
@@ -48,4 +72,5 @@ class Detection(BaseModel):
 class LabelSaveRequest(BaseModel):
     image_path: str
     labels: Dict[str, str]  # Maps detection index to selected label
-    detections: List[Detection]
\ No newline at end of file
+    detections: List[Detection]
+    project: str = "default"
\ No newline at end of file
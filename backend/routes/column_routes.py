@@ -1,7 +1,7 @@
 # column_routes.py
 from fastapi import APIRouter, Query
-import pandas as pd
 import os
+from services.data_reader import read_header
 
 router = APIRouter(prefix="/columns")
 
@@ -11,13 +11,8 @@ def get_columns(file_path: str = Query(...)):
         return {"error": "File not found", "file_path": file_path}
 
     try:
-        # Check file extension and read accordingly
-        if file_path.endswith(".xlsx") or file_path.endswith(".xls") or file_path.endswith(".csv"):
-            df = pd.read_excel(file_path)
-        else:
-            df = pd.read_csv(file_path)
-
-        columns = list(df.columns)
+        # Only the header is parsed; the format is sniffed from the file's contents
+        columns = read_header(file_path)
         return {"columns": columns}
     
     except Exception as e:
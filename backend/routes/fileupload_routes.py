@@ -1,12 +1,19 @@
 # upload_routes.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 import os
 import logging
-import pandas as pd
+from typing import Optional
 from state import get_state, State
+from services.column_index import get_column_index
+from services.data_reader import read_dataset, resolve_local_path, sniff_format, EXCEL_FORMATS
+from services.workbooks import convert_workbook, find_sheet, sheet_file_path, remove_converted_sheets
+from models.schemas import SheetSelectRequest
 
 router = APIRouter(prefix="/upload")
 
+VALIDATION_ROWS = 1000
+
 def validate_file_content(file_path: str) -> tuple[bool, str]:
     """Validate that a file can be read and contains valid data."""
     try:
@@ -17,10 +24,8 @@ def validate_file_content(file_path: str) -> tuple[bool, str]:
         if not os.path.exists(clean_path):
             return False, f"File not found at path: {clean_path}"
             
-        if clean_path.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(clean_path)
-        else:
-            df = pd.read_csv(clean_path)
+        # A sample is enough to check the file parses and has the expected shape
+        df = read_dataset(clean_path, nrows=VALIDATION_ROWS)
             
         if df.empty:
             return False, "File is empty"
@@ -33,8 +38,38 @@ def validate_file_content(file_path: str) -> tuple[bool, str]:
         logging.error(f"File validation error: {str(e)}")
         return False, f"Failed to read file: {str(e)}"
 
+def build_column_index(file_path: str) -> None:
+    """Build the column summary index for a freshly uploaded file."""
+    try:
+        get_column_index(file_path)
+    except Exception as e:
+        logging.warning(f"Failed to build column index for {file_path}: {str(e)}")
+
+def describe_sheets(file_path: str, manifest: dict) -> list:
+    """List a converted workbook's sheets with the path each one can be read from."""
+    return [
+        {
+            "index": sheet["index"],
+            "name": sheet["name"],
+            "rows": sheet["rows"],
+            "columns": sheet["columns"],
+            "file_path": sheet_file_path(file_path, sheet)
+        }
+        for sheet in manifest["sheets"]
+    ]
+
+def convert_uploaded_workbook(file_path: str) -> Optional[list]:
+    """Convert an uploaded workbook's sheets, returning None for other files or on failure."""
+    try:
+        if sniff_format(file_path) not in EXCEL_FORMATS:
+            return None
+        return describe_sheets(file_path, convert_workbook(file_path))
+    except Exception as e:
+        logging.warning(f"Failed to convert workbook {file_path}: {str(e)}")
+        return None
+
 @router.post("/file")
-async def upload_file(file: UploadFile = File(...), state: State = Depends(get_state)):
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...), state: State = Depends(get_state)):
     try:
         # Ensure uploads directory exists
         os.makedirs("uploads", exist_ok=True)
@@ -53,22 +88,32 @@ async def upload_file(file: UploadFile = File(...), state: State = Depends(get_s
             logging.error(f"Failed to save file: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
+        # Convert each sheet of a workbook to Parquet once, so later reads skip the Excel parser
+        sheets = await run_in_threadpool(convert_uploaded_workbook, file_path)
+
         # Validate file content
         is_valid, error_message = validate_file_content(file_path)
         if not is_valid:
             try:
                 os.remove(file_path)  # Clean up invalid file
+                remove_converted_sheets(file_path)
             except Exception as e:
                 logging.error(f"Failed to remove invalid file: {str(e)}")
             raise HTTPException(status_code=400, detail=error_message)
 
         # Update the file path in state
         state.set_file_path(file_path)
+
+        # Precompute chart summaries once per upload, after responding
+        background_tasks.add_task(build_column_index, file_path)
         
-        return {
+        response = {
             "file_path": file_path,
             "message": "File uploaded successfully"
         }
+        if sheets is not None:
+            response["sheets"] = sheets
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -100,3 +145,51 @@ async def validate_file(file_path: str = Query(...)):
     except Exception as e:
         logging.error(f"Error validating file: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error validating file: {str(e)}")
+
+@router.get("/sheets")
+async def get_sheets(file_path: str = Query(...)):
+    """List the sheets of an Excel workbook."""
+    try:
+        local_path = await run_in_threadpool(resolve_local_path, file_path)
+        if sniff_format(local_path) not in EXCEL_FORMATS:
+            raise HTTPException(status_code=400, detail="File is not an Excel workbook")
+
+        manifest = await run_in_threadpool(convert_workbook, local_path)
+        return {"sheets": describe_sheets(local_path, manifest)}
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error listing sheets: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error listing sheets: {str(e)}")
+
+@router.post("/sheets/select")
+async def select_sheet(request: SheetSelectRequest, state: State = Depends(get_state)):
+    """Make one sheet of a workbook the active dataset."""
+    try:
+        local_path = await run_in_threadpool(resolve_local_path, request.file_path)
+        if sniff_format(local_path) not in EXCEL_FORMATS:
+            raise HTTPException(status_code=400, detail="File is not an Excel workbook")
+
+        manifest = await run_in_threadpool(convert_workbook, local_path)
+        sheet = find_sheet(manifest, request.sheet)
+
+        # The converted sheet is an ordinary dataset for every other endpoint
+        sheet_path = sheet_file_path(local_path, sheet)
+        state.set_file_path(sheet_path)
+        return {
+            "file_path": sheet_path,
+            "sheet": sheet["name"],
+            "rows": sheet["rows"],
+            "columns": sheet["columns"]
+        }
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error selecting sheet: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error selecting sheet: {str(e)}")
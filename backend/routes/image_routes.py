@@ -1,15 +1,21 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
 from typing import List, Dict
-from ultralytics import YOLO
 from urllib.parse import urlparse
 import uuid
-import yaml
-import shutil
 import logging
 from pathlib import Path
 from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from services.yolo_service import yolo_service, is_ignored_label
+from services.inference_scheduler import inference_scheduler, InferenceQueueFull, RETRY_AFTER_SECONDS
+from services.image_ingest import ingest_image, public_url
+from services.dataset_export import iter_dataset_entries
+from utils.yaml_stream import dump_yaml, iter_yaml_mapping
+from utils.zip_stream import iter_zip
+from utils.file_handler import save_upload_async
 
 router = APIRouter(prefix="/image")
 
@@ -44,6 +50,8 @@ def ensure_directory(directory: str) -> None:
 # Initialize directories
 UPLOAD_DIR = "uploads"
 EXPORTS_DIR = "exports"
+# Images uploaded through the labelling routes
+LABEL_IMAGES_DIR = os.path.join(UPLOAD_DIR, "images")
 for directory in [UPLOAD_DIR, EXPORTS_DIR]:
     ensure_directory(directory)
 
@@ -82,16 +90,62 @@ class SaveLabelsRequest(BaseModel):
                 if not (0 <= label.confidence <= 1):
                     raise ValueError("Confidence score must be between 0 and 1")
 
-# Initialize YOLO model with better error handling
-try:
-    MODEL_PATH = "yolov8n.pt"
-    if not os.path.exists(MODEL_PATH):
-        logger.info(f"Downloading YOLO model to {MODEL_PATH}")
-    yolo_model = YOLO(MODEL_PATH)
-    logger.info("Successfully loaded YOLO model")
-except Exception as e:
-    logger.error(f"Failed to load YOLO model: {str(e)}")
-    yolo_model = None
+def iter_annotations(data: SaveLabelsRequest):
+    """Yield (image name, annotation) pairs, skipping N/A labels; a repeated name keeps its last image."""
+    image_names = [os.path.basename(urlparse(image_url).path) for image_url in data.images]
+    last_index = {image_name: index for index, image_name in enumerate(image_names)}
+
+    for index, (image_url, image_name) in enumerate(zip(data.images, image_names)):
+        if last_index[image_name] != index:
+            continue
+        try:
+            # Get labels for this image
+            image_labels = data.labels.get(str(index), [])
+
+            # Format the labels with detailed information, filtering out N/A, None, NA
+            formatted_labels = []
+            for label in image_labels:
+                try:
+                    if is_ignored_label(label.label):
+                        continue
+                    formatted_labels.append({
+                        "label": label.label,
+                        "bbox": {
+                            "coordinates": label.bbox,
+                            "format": "normalized_xyxy",  # x1,y1,x2,y2 in percentage
+                            "width_percent": label.bbox[2] - label.bbox[0],
+                            "height_percent": label.bbox[3] - label.bbox[1]
+                        },
+                        "confidence": label.confidence
+                    })
+                except Exception as e:
+                    logger.error(f"Error formatting label for {image_name}: {str(e)}")
+                    continue
+
+            yield image_name, {
+                "file_info": {
+                    "original_url": image_url,
+                    "index": index
+                },
+                "objects": formatted_labels
+            }
+        except Exception as e:
+            logger.error(f"Error processing image {image_url}: {str(e)}")
+            continue
+
+def write_labels_yaml(path: str, dataset_info: Dict, data: SaveLabelsRequest) -> None:
+    """Write the labels YAML incrementally rather than building the whole document first."""
+    with open(path, 'w', encoding='utf-8') as f:
+        dump_yaml({"dataset_info": dataset_info}, f, sort_keys=False, indent=2)
+        chunks = iter_yaml_mapping(iter_annotations(data), indent=2, sort_keys=False)
+        first = next(chunks, None)
+        if first is None:
+            f.write("annotations: {}\n")
+            return
+        f.write("annotations:\n")
+        f.write(first)
+        for text in chunks:
+            f.write(text)
 
 @router.post("/upload")
 async def upload_image(file: UploadFile = File(...)):
@@ -108,20 +162,36 @@ async def upload_image(file: UploadFile = File(...)):
         filename = f"{uuid.uuid4().hex}_{file.filename}"
         file_path = os.path.join(UPLOAD_DIR, filename)
 
-        # Save the file
+        # Save the file, streamed in chunks on the image executor
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload_async(file, file_path, executor=yolo_service.executor)
             logger.info(f"Successfully saved file: {filename}")
         except Exception as e:
             logger.error(f"Failed to save file: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
+        # Decode once into the model input and a preview, so neither needs the original again
+        try:
+            ingested = await yolo_service.run_image_task(ingest_image, file_path, inference_scheduler.image_size)
+        except InferenceQueueFull:
+            os.remove(file_path)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to decode image {file_path}: {str(e)}")
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail="File is not a readable image")
+
         return {
             "file_path": file_path,
+            "thumbnail_url": public_url(ingested["thumbnail"]),
             "message": "File uploaded successfully"
         }
 
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejected upload: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -129,9 +199,6 @@ async def upload_image(file: UploadFile = File(...)):
 @router.post("/detect")
 async def detect_objects(file: UploadFile = File(...)):
     """Detect objects in an uploaded image."""
-    if yolo_model is None:
-        raise HTTPException(status_code=500, detail="YOLO model not initialized")
-
     try:
         if not file:
             raise HTTPException(status_code=400, detail="No file provided")
@@ -147,8 +214,7 @@ async def detect_objects(file: UploadFile = File(...)):
         try:
             # Save file with error handling
             try:
-                with open(temp_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                await save_upload_async(file, temp_path, executor=yolo_service.executor)
                 logger.info(f"Saved temporary file for detection: {temp_path}")
             except Exception as e:
                 logger.error(f"Failed to save temporary file: {str(e)}")
@@ -164,51 +230,18 @@ async def detect_objects(file: UploadFile = File(...)):
 
             # Run YOLO detection with explicit error handling
             try:
-                results = yolo_model(temp_path, verbose=True)  # Enable verbose mode for debugging
+                # Cached by content, otherwise batched with concurrent requests off the event loop
+                detections = await yolo_service.detect_objects_async(temp_path)
                 logger.info(f"YOLO detection completed on {temp_path}")
-                
-                if not results:
-                    logger.warning("No detection results returned by YOLO")
-                    return {"boxes": []}
-
-                detections = []
-                for r in results:
-                    if not r.boxes:
-                        logger.info("No boxes detected in this result")
-                        continue
-                        
-                    logger.info(f"Processing {len(r.boxes)} detected boxes")
-                    for box in r.boxes:
-                        try:
-                            # Get coordinates and convert to percentages
-                            x1, y1, x2, y2 = box.xyxyn[0].tolist()
-                            
-                            # Get class label
-                            class_id = int(box.cls[0]) if box.cls is not None else -1
-                            label = r.names[class_id] if class_id in r.names else "Unknown"
-                            
-                            # Get confidence
-                            confidence = float(box.conf[0]) if box.conf is not None else 0.0
-                            
-                            detection = {
-                                "label": label,
-                                "confidence": confidence,
-                                "bbox": [
-                                    float(x1) * 100,
-                                    float(y1) * 100,
-                                    float(x2) * 100,
-                                    float(y2) * 100
-                                ]
-                            }
-                            logger.info(f"Detected {label} with confidence {confidence:.2f}")
-                            detections.append(detection)
-                        except Exception as e:
-                            logger.error(f"Error processing detection box: {str(e)}")
-                            continue
+                for detection in detections:
+                    logger.info(f"Detected {detection['label']} with confidence {detection['confidence']:.2f}")
 
                 logger.info(f"Successfully detected {len(detections)} objects")
                 return {"boxes": detections}
 
+            except InferenceQueueFull as e:
+                logger.warning(f"Rejected detection: {str(e)}")
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
             except Exception as e:
                 logger.error(f"YOLO detection failed: {str(e)}")
                 raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
@@ -222,6 +255,8 @@ async def detect_objects(file: UploadFile = File(...)):
                 except Exception as e:
                     logger.error(f"Failed to clean up temporary file: {str(e)}")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Detection failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -252,69 +287,18 @@ async def save_labels(data: SaveLabelsRequest):
                     detail="Failed to prepare file for writing"
                 )
 
-        # Prepare the data structure for YAML
-        yaml_data = {
-            "dataset_info": {
-                "created_at": datetime.now().isoformat(),
-                "total_images": len(data.images),
-                "total_annotations": data.total_annotations,
-                "export_timestamp": timestamp
-            },
-            "annotations": {}
+        created_at = datetime.now().isoformat()
+        dataset_info = {
+            "created_at": created_at,
+            "total_images": len(data.images),
+            "total_annotations": data.total_annotations,
+            "export_timestamp": timestamp
         }
 
-        for index, image_url in enumerate(data.images):
-            try:
-                # Extract filename from URL or path
-                parsed_url = urlparse(image_url)
-                image_name = os.path.basename(parsed_url.path)
-                
-                # Get labels for this image
-                image_labels = data.labels.get(str(index), [])
-                
-                # Format the labels with detailed information, filtering out N/A, None, NA
-                formatted_labels = []
-                for label in image_labels:
-                    try:
-                        if str(label.label).strip().lower() in ["n/a", "none", "na"]:
-                            continue
-                        formatted_labels.append({
-                            "label": label.label,
-                            "bbox": {
-                                "coordinates": label.bbox,
-                                "format": "normalized_xyxy",  # x1,y1,x2,y2 in percentage
-                                "width_percent": label.bbox[2] - label.bbox[0],
-                                "height_percent": label.bbox[3] - label.bbox[1]
-                            },
-                            "confidence": label.confidence
-                        })
-                    except Exception as e:
-                        logger.error(f"Error formatting label for {image_name}: {str(e)}")
-                        continue
-                
-                yaml_data["annotations"][image_name] = {
-                    "file_info": {
-                        "original_url": image_url,
-                        "index": index
-                    },
-                    "objects": formatted_labels
-                }
-            except Exception as e:
-                logger.error(f"Error processing image {image_url}: {str(e)}")
-                continue
-
-        # Save to YAML file with proper formatting and error handling
+        # Stream the annotations into the file image by image with the C dumper
         try:
             temp_path = f"{yaml_path}.tmp"
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                yaml.safe_dump(
-                    yaml_data,
-                    f,
-                    default_flow_style=False,
-                    allow_unicode=True,
-                    sort_keys=False,
-                    indent=2
-                )
+            await run_in_threadpool(write_labels_yaml, temp_path, dataset_info, data)
             # Atomic rename for safer file writing
             os.replace(temp_path, yaml_path)
             logger.info(f"Successfully saved labels to {yaml_path}")
@@ -336,8 +320,8 @@ async def save_labels(data: SaveLabelsRequest):
                 "message": "Labels saved successfully",
                 "summary": {
                     "total_images": len(data.images),
-                    "total_annotations": yaml_data["dataset_info"]["total_annotations"],
-                    "created_at": yaml_data["dataset_info"]["created_at"]
+                    "total_annotations": data.total_annotations,
+                    "created_at": created_at
                 }
             }
         except Exception as e:
@@ -349,3 +333,34 @@ async def save_labels(data: SaveLabelsRequest):
     except Exception as e:
         logger.error(f"Error saving labels: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/export-dataset")
+async def export_dataset(data: SaveLabelsRequest, dataset_format: str = "yolo", val_split: float = 0.0,
+                         random_state: int = 42, include_images: bool = True):
+    """Export labelled images as a YOLO or COCO dataset, streamed as a zip."""
+    try:
+        try:
+            data.validate_data()
+            entries = iter_dataset_entries(
+                data.images,
+                {index: [label.dict() for label in labels] for index, labels in data.labels.items()},
+                dataset_format,
+                val_split=val_split,
+                random_state=random_state,
+                search_dirs=[UPLOAD_DIR, LABEL_IMAGES_DIR],
+                include_images=include_images
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return StreamingResponse(
+            iter_zip(entries),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename=dataset_{dataset_format}.zip"}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting dataset: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
-from typing import List, Dict, Any
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional
 import os
 import shutil
+import asyncio
+import tempfile
+import zipfile
 from services.yolo_service import yolo_service
+from services.inference_scheduler import inference_scheduler, InferenceQueueFull, RETRY_AFTER_SECONDS
+from services.image_ingest import ingest_image, THUMBNAIL_MEDIA_TYPE, INGEST_DIR
+from services.splitting import SPLITS_DIR
+from services.label_store import label_store
 from models.schemas import LabelSaveRequest
+from utils.file_serving import file_response
+from utils.file_handler import save_upload_async
+from utils.image_labeller import extract_images, list_images, iter_auto_labels, iter_ndjson
+from utils.yaml_stream import iter_yaml_list, iter_json_list
 import logging
+import uuid
 from pathlib import Path
-import yaml
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,10 +30,9 @@ UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 IMAGES_DIR = os.path.join(UPLOAD_DIR, "images")
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
-# Store labels data in memory (you might want to use a database in production)
-labels_data = []
-
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
+# Directories of derived files under uploads, never labelled as datasets
+DERIVED_DIRS = [INGEST_DIR, SPLITS_DIR]
 
 def is_valid_image(filename: str) -> bool:
     """Check if the file has a valid image extension."""
@@ -42,22 +53,32 @@ async def upload_images(file: UploadFile = File(...)):
         file_path = os.path.join(IMAGES_DIR, safe_filename)
 
         try:
-            # Save the file
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            # Save the file, streamed in chunks on the image executor
+            await save_upload_async(file, file_path, executor=yolo_service.executor)
 
             # Perform object detection
-            detections = yolo_service.detect_objects(file_path)
+            detections = await yolo_service.detect_objects_async(file_path)
 
             return {
                 "image_path": safe_filename,
+                "thumbnail_url": f"/label/thumbnails/{safe_filename}",
                 "detections": detections
             }
 
+        except InferenceQueueFull:
+            # Nothing was labelled, so the upload is not kept
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
         except Exception as e:
             logger.error(f"Error processing file {file.filename}: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejected upload: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
     except Exception as e:
         logger.error(f"Error processing upload: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -75,11 +96,10 @@ async def detect_objects(file: UploadFile = File(...)):
         # Save the uploaded file temporarily
         temp_path = os.path.join(UPLOAD_DIR, f"temp_{file.filename}")
         try:
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            await save_upload_async(file, temp_path, executor=yolo_service.executor)
 
             # Perform detection
-            detections = yolo_service.detect_objects(temp_path)
+            detections = await yolo_service.detect_objects_async(temp_path)
 
             return {"detections": detections}
 
@@ -88,10 +108,84 @@ async def detect_objects(file: UploadFile = File(...)):
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejected detection: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
     except Exception as e:
         logger.error(f"Error detecting objects: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/auto-label")
+async def auto_label(file: UploadFile = File(None), folder_path: str = Form(None)):
+    """Auto-label a zip of images or a folder under uploads, streaming results as NDJSON."""
+    try:
+        if (file is None) == (folder_path is None):
+            raise HTTPException(status_code=400, detail="Provide either a zip file or a folder path")
+
+        job_id = uuid.uuid4().hex
+        job_dir = None
+        if file is not None:
+            if Path(file.filename).suffix.lower() != ".zip":
+                raise HTTPException(status_code=400, detail="File must be a zip archive")
+            zip_path = os.path.join(UPLOAD_DIR, f"auto_label_{job_id}.zip")
+            await save_upload_async(file, zip_path, executor=yolo_service.executor)
+            # Extracted images only live for the job, outside the public uploads directory
+            job_dir = tempfile.mkdtemp(prefix=f"auto_label_{job_id}_")
+            try:
+                image_paths = await run_in_threadpool(extract_images, zip_path, job_dir)
+            except zipfile.BadZipFile:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise HTTPException(status_code=400, detail="Invalid zip archive")
+            except Exception:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+            finally:
+                os.remove(zip_path)
+            base_dir = job_dir
+        else:
+            # Only dataset folders inside the uploads directory may be labelled
+            uploads = os.path.realpath(UPLOAD_DIR)
+            folder = os.path.realpath(os.path.join(UPLOAD_DIR, folder_path))
+            if folder == uploads or os.path.commonpath([folder, uploads]) != uploads:
+                raise HTTPException(status_code=400, detail="Folder must be a subfolder of the uploads directory")
+            derived = [os.path.realpath(path) for path in DERIVED_DIRS]
+            if any(os.path.commonpath([folder, path]) == path for path in derived):
+                raise HTTPException(status_code=400, detail="Folder holds derived files and cannot be labelled")
+            if not os.path.isdir(folder):
+                raise HTTPException(status_code=404, detail="Folder not found")
+            image_paths = await run_in_threadpool(list_images, folder, derived)
+            base_dir = folder
+
+        if not image_paths:
+            if job_dir is not None:
+                shutil.rmtree(job_dir, ignore_errors=True)
+            raise HTTPException(status_code=400, detail="No images found")
+
+        yaml_filename = f"labels_{job_id}.yaml"
+        yaml_path = os.path.join(UPLOAD_DIR, yaml_filename)
+
+        def events():
+            try:
+                for event in iter_auto_labels(image_paths, yaml_path, base_dir=base_dir):
+                    if event.get("done"):
+                        event = {**event, "yaml_path": f"/uploads/{yaml_filename}", "total": len(image_paths)}
+                    yield event
+            finally:
+                if job_dir is not None:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+
+        return StreamingResponse(iter_ndjson(events()), media_type="application/x-ndjson")
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error auto-labelling images: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/save-labels")
 async def save_labels(request: LabelSaveRequest):
     """Save labels for an image."""
@@ -101,62 +195,86 @@ async def save_labels(request: LabelSaveRequest):
         if not os.path.exists(image_path):
             raise HTTPException(status_code=404, detail="Image not found")
 
-        # Add the labels data to our list
-        labels_data.append({
-            "image_path": request.image_path,
-            "labels": request.labels,
-            "detections": request.detections
-        })
-
-        # If list gets too large, save to disk and clear
-        if len(labels_data) > 1000:
-            temp_path = os.path.join(UPLOAD_DIR, "temp_labels.yaml")
-            yolo_service.save_to_yaml(temp_path, labels_data)
-            labels_data.clear()
+        # Appended to the label store; resolves once the writer has committed it
+        entry_id = await asyncio.wrap_future(label_store.save(
+            request.image_path,
+            request.labels,
+            [detection.dict() for detection in request.detections],
+            project=request.project
+        ))
 
-        return {"message": "Labels saved successfully"}
+        return {"message": "Labels saved successfully", "id": entry_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error saving labels: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+EXPORT_FORMATS = ["yaml", "json"]
+
+def _export_entries(project: Optional[str]):
+    for entry in label_store.iter_labels(project):
+        yield {"image_path": entry["image_path"], "labels": entry["labels"], "detections": entry["detections"]}
+
 @router.post("/export-yaml")
-async def export_yaml():
-    """Export all labels to a YAML file."""
+async def export_yaml(project: Optional[str] = None, output_format: str = "yaml"):
+    """Export all labels as YAML (or JSON), streamed from the label store one chunk at a time."""
     try:
-        if not labels_data:
+        if output_format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid export format. Must be one of: {', '.join(EXPORT_FORMATS)}")
+        if not await run_in_threadpool(label_store.count, project):
             raise HTTPException(status_code=400, detail="No labels data to export")
 
-        # Create YAML content in memory
-        yaml_content = yaml.dump(labels_data, default_flow_style=False)
-        
-        # Create a temporary file-like object
-        from io import BytesIO
-        file_like = BytesIO(yaml_content.encode('utf-8'))
-        
-        # Return the file directly
+        if output_format == "json":
+            return StreamingResponse(
+                iter_json_list(_export_entries(project)),
+                media_type="application/json",
+                headers={"Content-Disposition": "attachment; filename=labels.json"}
+            )
         return StreamingResponse(
-            file_like,
+            iter_yaml_list(_export_entries(project)),
             media_type="application/x-yaml",
-            headers={
-                "Content-Disposition": "attachment; filename=labels.yaml"
-            }
+            headers={"Content-Disposition": "attachment; filename=labels.yaml"}
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error exporting YAML: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/images/{image_path}")
-async def get_image(image_path: str):
-    """Serve an image file."""
+async def get_image(image_path: str, request: Request):
+    """Serve an image file with Range and ETag support."""
     try:
         file_path = os.path.join(IMAGES_DIR, image_path)
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Image not found")
         if not is_valid_image(file_path):
             raise HTTPException(status_code=400, detail="Invalid image file")
-        return FileResponse(file_path)
+        return await file_response(request, file_path)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error serving image: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to serve image") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to serve image") 
+
+@router.get("/thumbnails/{image_path}")
+async def get_thumbnail(image_path: str, request: Request):
+    """Serve a small WebP preview of an image, generated once per image content."""
+    try:
+        file_path = os.path.join(IMAGES_DIR, image_path)
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Image not found")
+        if not is_valid_image(file_path):
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        ingested = await yolo_service.run_image_task(ingest_image, file_path, inference_scheduler.image_size)
+        return await file_response(request, ingested["thumbnail"], media_type=THUMBNAIL_MEDIA_TYPE)
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    except Exception as e:
+        logger.error(f"Error serving thumbnail: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to serve thumbnail")
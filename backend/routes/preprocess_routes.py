@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Form, Query, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from models.schemas import PreprocessRequest, EncodingRequest, SplitDataRequest
 import pandas as pd
 from services.preprocessing import (
@@ -10,6 +11,10 @@ from services.preprocessing import (
     get_categorical_fields,
     download_from_supabase
 )
+from services.splitting import split_file_extension, open_split_part, iter_rows_csv, SplitSourceChanged
+from services.remote_cache import fetch_remote_file
+from utils.zip_stream import iter_zip, file_entry, DEFAULT_COMPRESSLEVEL
+from utils.file_serving import file_response
 from state import get_state, State
 import logging
 import os
@@ -21,7 +26,6 @@ import numpy as np
 from pathlib import Path
 import shutil
 import tempfile
-import zipfile
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
@@ -45,7 +49,7 @@ async def get_missing_values(file_path: str = Query(...)):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        df = pd.read_csv(file_path)
+        df = read_data_file(file_path)
         missing_info = []
         
         for column in df.columns:
@@ -82,20 +86,12 @@ async def handle_missing_values(
 
         # Download the file from Supabase Storage if it's a URL
         if file_path.startswith('http'):
-            import requests
-            import tempfile
-            response = requests.get(file_path)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp:
-                tmp.write(response.content)
-                local_file_path = tmp.name
+            local_file_path = download_from_supabase(file_path)
         else:
             local_file_path = file_path
             
         # Read and process the file
-        df = pd.read_csv(local_file_path)
+        df = read_data_file(local_file_path)
         rows_before = len(df)
         
         for column, strategy in strategies_dict.items():
@@ -139,17 +135,8 @@ async def get_categorical_fields_endpoint(file_path: str = Query(...)):
     try:
         # Check if the file path is a URL
         if file_path.startswith('http'):
-            import requests
-            import tempfile
-            
-            # Download the file from Supabase Storage
-            response = requests.get(file_path)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp:
-                tmp.write(response.content)
-                local_file_path = tmp.name
+            # Get the file from the local cache of Supabase Storage
+            local_file_path = download_from_supabase(file_path)
         else:
             # Handle local file
             if not os.path.exists(file_path):
@@ -174,17 +161,8 @@ async def encode_labels_endpoint(
     try:
         # Check if the file path is a URL
         if file_path.startswith('http'):
-            import requests
-            import tempfile
-            
-            # Download the file from Supabase Storage
-            response = requests.get(file_path)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp:
-                tmp.write(response.content)
-                local_file_path = tmp.name
+            # Get the file from the local cache of Supabase Storage
+            local_file_path = download_from_supabase(file_path)
         else:
             # Handle local file
             if not os.path.exists(file_path):
@@ -197,14 +175,6 @@ async def encode_labels_endpoint(
         # Perform encoding
         result = encode_categorical_variables(local_file_path, fields_dict)
         
-        # Clean up temporary file if it was created
-        if file_path.startswith('http'):
-            try:
-                os.unlink(local_file_path)
-                logger.info(f"Cleaned up temporary file: {local_file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary file {local_file_path}: {str(e)}")
-        
         return result
     except Exception as e:
         logger.error(f"Error encoding labels: {str(e)}")
@@ -217,8 +187,12 @@ def split_data_endpoint(req: SplitDataRequest, state: State = Depends(get_state)
         file_path = req.file_path if req.file_path else state.get_file_path()
         if not file_path:
             raise HTTPException(status_code=400, detail="No file path provided")
-            
-        if not os.path.exists(file_path):
+
+        if urlparse(file_path).scheme in ['http', 'https']:
+            # Only index splits keep their outputs off the source's directory
+            if req.mode != "index":
+                raise HTTPException(status_code=400, detail="Remote files can only be split in index mode")
+        elif not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
             
         logger.info(f"Splitting data for file: {file_path}")
@@ -226,46 +200,73 @@ def split_data_endpoint(req: SplitDataRequest, state: State = Depends(get_state)
             file_path=file_path,
             test_size=req.test_size,
             random_state=req.random_state,
-            target_column=req.target_column
+            target_column=req.target_column,
+            output_format=req.output_format,
+            mode=req.mode,
+            strategy=req.strategy,
+            group_column=req.group_column,
+            time_column=req.time_column,
+            n_splits=req.n_splits
         )
         return result
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         logger.error(f"Validation error in data split: {str(e)}")
-        raise HTTPException(status_code=422, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in data split: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/split/{split_id}/{part}")
+def download_split_part(split_id: str, part: str, fold: Optional[int] = None):
+    """Materialise one part of an index split (or of one fold) and stream it as CSV."""
+    try:
+        df, columns, row_ids = open_split_part(split_id, part, fold)
+        filename = f"{part}.csv" if fold is None else f"fold{fold}_{part}.csv"
+        return StreamingResponse(
+            iter_rows_csv(df, columns, row_ids),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SplitSourceChanged as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Validation error in split download: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in split download: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/download")
-async def download_file(file_path: str):
-    """Download a file from either the uploads directory or a temporary file."""
+async def download_file(file_path: str, request: Request):
+    """Download a file from the uploads directory or a cached remote copy, with Range and ETag support."""
     try:
         # Check if the file exists directly
         if os.path.exists(file_path):
-            return FileResponse(file_path, filename=os.path.basename(file_path))
+            return await file_response(request, file_path, filename=os.path.basename(file_path))
         
         # If not, check in the uploads directory
         clean_path = file_path.replace('/', os.sep).replace('\\', os.sep)
         abs_path = os.path.join("uploads", clean_path)
         
         if os.path.exists(abs_path):
-            return FileResponse(abs_path, filename=os.path.basename(abs_path))
+            return await file_response(request, abs_path, filename=os.path.basename(abs_path))
         
-        # If the file is a URL (from Supabase), download it
+        # If the file is a URL (from Supabase), serve it from the local remote cache
         if file_path.startswith('http'):
-            import requests
-            import tempfile
-            
-            response = requests.get(file_path)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp:
-                tmp.write(response.content)
-                return FileResponse(tmp.name, filename=os.path.basename(file_path))
+            local_path = await run_in_threadpool(fetch_remote_file, file_path)
+            filename = os.path.basename(urlparse(file_path).path) or os.path.basename(local_path)
+            return await file_response(request, local_path, filename=filename)
         
         raise HTTPException(status_code=404, detail="File not found")
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -332,65 +333,34 @@ async def download_split_files(request: Request):
         if not files:
             raise HTTPException(status_code=400, detail="No files provided for download.")
 
+        compresslevel = data.get("compresslevel", DEFAULT_COMPRESSLEVEL)
+        if not isinstance(compresslevel, int) or not 0 <= compresslevel <= 9:
+            raise HTTPException(status_code=400, detail="compresslevel must be an integer between 0 and 9.")
+        # None lets the archive store already-compressed formats and deflate the rest
+        store = data.get("store")
+
         logger.info(f"Received files for download: {files}")
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp:
-            with zipfile.ZipFile(tmp.name, "w") as zipf:
-                for key, path in files.items():
-                    # Clean up file path and ensure it's within uploads directory
-                    clean_path = path.replace('/', os.sep).replace('\\', os.sep)
-                    if not os.path.exists(clean_path):
-                        logger.error(f"File not found: {clean_path}")
-                        raise HTTPException(status_code=404, detail=f"File not found: {clean_path}")
-                    
-                    # Add file to zip with a descriptive name
-                    zipf.write(clean_path, arcname=f"{key}_data.csv")
-                    logger.info(f"Added {clean_path} to zip as {key}_data.csv")
-            tmp_path = tmp.name
 
-        return FileResponse(
-            tmp_path,
-            filename="train_test_split.zip",
-            media_type="application/zip"
+        # Validate every file before the first byte of the archive is sent
+        entries = []
+        for key, path in files.items():
+            clean_path = path.replace('/', os.sep).replace('\\', os.sep)
+            if not os.path.exists(clean_path):
+                logger.error(f"File not found: {clean_path}")
+                raise HTTPException(status_code=404, detail=f"File not found: {clean_path}")
+
+            # Add file to zip with a descriptive name, keeping its format extension
+            arcname = f"{key}_data{split_file_extension(clean_path) or '.csv'}"
+            entries.append(file_entry(clean_path, arcname, compresslevel=compresslevel, store=store))
+            logger.info(f"Adding {clean_path} to zip as {arcname}")
+
+        return StreamingResponse(
+            iter_zip(entries),
+            media_type="application/zip",
+            headers={"Content-Disposition": "attachment; filename=train_test_split.zip"}
         )
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error creating zip file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-
-def read_data_file(file_path: str) -> pd.DataFrame:
-    try:
-        # Check if the file path is a URL
-        parsed_url = urlparse(file_path)
-        if parsed_url.scheme in ['http', 'https']:
-            # Download the file from Supabase
-            local_path = download_from_supabase(file_path)
-            try:
-                # Determine file type and read accordingly
-                if local_path.endswith(('.xlsx', '.xls')):
-                    df = pd.read_excel(local_path)
-                else:
-                    df = pd.read_csv(local_path)
-            except Exception as e:
-                logger.error(f"Error reading downloaded file {local_path}: {str(e)}")
-                raise
-            finally:
-                # Clean up the temporary file
-                try:
-                    os.unlink(local_path)
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temporary file {local_path}: {str(e)}")
-            return df
-        else:
-            # Handle local file
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File not found: {file_path}")
-                
-            if file_path.endswith(('.xlsx', '.xls')):
-                return pd.read_excel(file_path)
-            else:
-                return pd.read_csv(file_path)
-    except Exception as e:
-        logger.error(f"Error reading file {file_path}: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import pandas as pd
-from sklearn.model_selection import train_test_split
 import os
 from typing import Optional
 import logging
+from services.preprocessing import split_data_by_index, SPLIT_MODES
+from services.splitting import stream_split_csv, holdout_split_frames
+from services.data_reader import read_dataset
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -14,6 +16,11 @@ class SplitParams(BaseModel):
     test_size: float
     random_state: Optional[int] = None
     target_column: str
+    mode: str = "files"  # files, index, stream
+    strategy: str = "random"  # random, stratified, group, time, kfold, stratified_kfold, group_kfold
+    group_column: Optional[str] = None
+    time_column: Optional[str] = None
+    n_splits: int = 5
 
 @router.post("/split-data")
 async def split_data(params: SplitParams):
@@ -21,6 +28,8 @@ async def split_data(params: SplitParams):
         # Validate test size
         if not 0 < params.test_size < 1:
             raise HTTPException(status_code=400, detail="Test size must be between 0 and 1")
+        if params.mode not in SPLIT_MODES:
+            raise HTTPException(status_code=400, detail=f"Invalid split mode. Must be one of: {', '.join(SPLIT_MODES)}")
         
         # Read the preprocessed file
         input_file_path = os.path.join("uploads", params.input_file)
@@ -28,8 +37,42 @@ async def split_data(params: SplitParams):
         
         if not os.path.exists(input_file_path):
             raise HTTPException(status_code=404, detail=f"Input file not found at {input_file_path}")
+
+        # Index mode stores row ids only; parts are materialised on download
+        if params.mode == "index":
+            return await run_in_threadpool(
+                split_data_by_index,
+                input_file_path,
+                test_size=params.test_size,
+                random_state=params.random_state,
+                target_column=params.target_column,
+                strategy=params.strategy,
+                group_column=params.group_column,
+                time_column=params.time_column,
+                n_splits=params.n_splits
+            )
         
-        df = pd.read_csv(input_file_path)
+        # Create split directory
+        base_name = os.path.splitext(params.input_file)[0]
+        split_dir = f"{base_name}_split"
+        split_dir_path = os.path.join("uploads", split_dir)
+        os.makedirs(split_dir_path, exist_ok=True)
+        logger.info(f"Created split directory at: {split_dir_path}")
+
+        # Stream mode splits chunk by chunk without loading the whole file
+        if params.mode == "stream":
+            result = await run_in_threadpool(
+                stream_split_csv, input_file_path, split_dir_path, params.test_size,
+                params.random_state, params.target_column, strategy=params.strategy
+            )
+            return {
+                "message": "Data split successfully",
+                "files": {name: f"{split_dir}/{os.path.basename(path)}" for name, path in result["files"].items()},
+                "sizes": result["sizes"],
+                "random_state": result["random_state"]
+            }
+
+        df = read_dataset(input_file_path)
         logger.info(f"Successfully read input file with shape: {df.shape}")
         
         # Check if target column exists
@@ -37,22 +80,15 @@ async def split_data(params: SplitParams):
             raise HTTPException(status_code=400, detail=f"Target column '{params.target_column}' not found in the dataset")
         
         # Split the data
-        X = df.drop(columns=[params.target_column])
-        y = df[params.target_column]
-        
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, 
+        X_train, X_test, y_train, y_test = holdout_split_frames(
+            df, params.target_column,
             test_size=params.test_size,
-            random_state=params.random_state
+            random_state=params.random_state,
+            strategy=params.strategy,
+            group_column=params.group_column,
+            time_column=params.time_column
         )
         
-        # Create split directory
-        base_name = os.path.splitext(params.input_file)[0]
-        split_dir = f"{base_name}_split"
-        split_dir_path = os.path.join("uploads", split_dir)
-        os.makedirs(split_dir_path, exist_ok=True)
-        logger.info(f"Created split directory at: {split_dir_path}")
-        
         # Define file paths
         X_train_path = os.path.join(split_dir_path, "X_train.csv")
         X_test_path = os.path.join(split_dir_path, "X_test.csv")
@@ -83,6 +119,11 @@ async def split_data(params: SplitParams):
             }
         }
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error in split_data: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in split_data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
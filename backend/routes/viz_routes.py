@@ -1,10 +1,29 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from models.schemas import VisualizationRequest, ExportToPPTRequest
-from services.visualization import generate_chart_data, export_to_ppt
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from fastapi.responses import FileResponse, Response
+from models.schemas import VisualizationRequest, ExportToPPTRequest, ChartSpec, ReportRequest
+from services.visualization import (
+    prepare_chart_frame,
+    read_chart_source,
+    build_chart_frame,
+    to_columnar,
+    check_chart_data,
+    chart_series,
+    export_to_ppt,
+    build_report_pptx,
+    build_report_pdf
+)
+from services.chart_renderer import render_chart_png_async, CHART_DPI
+from services.chart_cache import chart_cache
+from services.chart_payload import validate_payload_options, encode_chart_payload
 from services.preprocessing import download_from_supabase
+from services.column_index import get_column_index, summarize_columns, check_chart_columns, axis_ranges
+import asyncio
 import os
 import logging
+import pandas as pd
+from typing import List, Optional
 from urllib.parse import urlparse
 
 # Configure logging
@@ -13,53 +32,79 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/visualize")
 
+REPORT_FORMATS = {
+    "pptx": ("application/vnd.openxmlformats-officedocument.presentationml.presentation", "chart_report.pptx"),
+    "pdf": ("application/pdf", "chart_report.pdf"),
+}
+MAX_REPORT_CHARTS = 50
+REPORT_PDF_DPI = 150
+
+def remove_file(path: str) -> None:
+    """Delete a generated artifact after it has been sent."""
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Failed to remove generated file {path}: {str(e)}")
+
+def prepare_report_frames(df: pd.DataFrame, specs: List[ChartSpec]) -> List[pd.DataFrame]:
+    """Prepare one chart frame per spec from a single loaded dataset."""
+    frames = []
+    for position, spec in enumerate(specs, start=1):
+        try:
+            frames.append(build_chart_frame(df, spec.x_col, spec.y_col, spec.chart_type))
+        except ValueError as e:
+            raise ValueError(f"Chart {position} ({spec.y_col} vs {spec.x_col}): {str(e)}")
+    return frames
+
+def build_chart_response(file_path: str, req: VisualizationRequest):
+    """Prepare chart data for a local file in the requested payload format."""
+    # The column index answers validation and full-data axis ranges without touching the rows
+    index = get_column_index(file_path)
+    check_chart_columns(index, req.x_col, req.y_col, req.chart_type)
+    ranges = axis_ranges(index, req.x_col, req.y_col)
+
+    frame = prepare_chart_frame(file_path, req.x_col, req.y_col, req.chart_type)
+
+    # Keep the prepared data server-side so exports can refer to it by id
+    chart_id = chart_cache.put(frame, req.chart_type, req.x_col, req.y_col)
+
+    if req.response_format == "records" and req.compression is None:
+        chart_data = frame.to_dict('records')
+        logger.info(f"Successfully generated {req.chart_type} chart data with {len(chart_data)} points")
+        return {
+            "chart_id": chart_id,
+            "chart_data": chart_data,
+            "axis_ranges": ranges,
+            "message": "Chart data generated successfully"
+        }
+
+    body, media_type, headers = encode_chart_payload(
+        frame, req.x_col, req.y_col, req.response_format, req.compression, chart_id=chart_id, axis_ranges=ranges
+    )
+    return Response(content=body, media_type=media_type, headers=headers)
+
 @router.post("/")
 async def create_visualization(req: VisualizationRequest):
     """Generate chart data from the input file and selected columns."""
     try:
         logger.info(f"Generating {req.chart_type} chart for file: {req.file_path}")
-        
+        validate_payload_options(req.response_format, req.compression)
+
         # Check if the file path is a URL
         parsed_url = urlparse(req.file_path)
         if parsed_url.scheme in ['http', 'https']:
             # Download the file from Supabase
-            local_path = download_from_supabase(req.file_path)
-            try:
-                # Generate chart data
-                chart_data = generate_chart_data(
-                    file_path=local_path,
-                    x_col=req.x_col,
-                    y_col=req.y_col,
-                    chart_type=req.chart_type
-                )
-                return {
-                    "chart_data": chart_data,
-                    "message": "Chart data generated successfully"
-                }
-            finally:
-                # Clean up the temporary file
-                try:
-                    os.unlink(local_path)
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temporary file {local_path}: {str(e)}")
+            local_path = await run_in_threadpool(download_from_supabase, req.file_path)
+            return await run_in_threadpool(build_chart_response, local_path, req)
         else:
             # Handle local file
             if not os.path.exists(req.file_path):
                 raise HTTPException(status_code=404, detail=f"File not found: {req.file_path}")
 
-            # Generate chart data
-            chart_data = generate_chart_data(
-                file_path=req.file_path,
-                x_col=req.x_col,
-                y_col=req.y_col,
-                chart_type=req.chart_type
-            )
-
-            return {
-                "chart_data": chart_data,
-                "message": "Chart data generated successfully"
-            }
+            return await run_in_threadpool(build_chart_response, req.file_path, req)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Validation error in chart generation: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -67,15 +112,56 @@ async def create_visualization(req: VisualizationRequest):
         logger.error(f"Error in chart generation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/summary")
+async def get_column_summary(file_path: str = Query(...), columns: Optional[List[str]] = Query(None)):
+    """Return precomputed per-column histograms, quantiles and value counts."""
+    try:
+        parsed_url = urlparse(file_path)
+        if parsed_url.scheme in ['http', 'https']:
+            # The cached copy is stable between versions, so its index can be kept too
+            local_path = download_from_supabase(file_path)
+            index = get_column_index(local_path)
+        else:
+            if not os.path.exists(file_path):
+                raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+            index = get_column_index(file_path)
+
+        return {
+            "rows": index["rows"],
+            "columns": summarize_columns(index, columns)
+        }
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error in column summary: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in column summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/export-ppt")
 async def export_chart_to_ppt(request: ExportToPPTRequest):
     """Export chart data to a PowerPoint presentation."""
     try:
+        # Resolve a server-side chart reference instead of uploaded data
+        if request.chart_id:
+            entry = chart_cache.get(request.chart_id)
+            if entry is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Chart not found or expired. Please regenerate the chart."
+                )
+            request.chart_data = to_columnar(entry["frame"], entry["x_col"], entry["y_col"])
+            request.chart_type = request.chart_type or entry["chart_type"]
+            request.x_column = request.x_column or entry["x_col"]
+            request.y_column = request.y_column or entry["y_col"]
+
         # Validate request data
         if not request.chart_data:
             raise HTTPException(
                 status_code=400,
-                detail="Chart data is required"
+                detail="Chart data or chart_id is required"
             )
             
         if not request.chart_type:
@@ -98,14 +184,24 @@ async def export_chart_to_ppt(request: ExportToPPTRequest):
                 detail=f"Invalid chart type. Must be one of: {', '.join(valid_chart_types)}"
             )
             
-        logger.info(f"Exporting chart to PPT: {request.chart_type} chart with {len(request.chart_data)} data points")
+        try:
+            point_count = check_chart_data(request.chart_data, request.x_column, request.y_column)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        logger.info(f"Exporting chart to PPT: {request.chart_type} chart with {point_count} data points")
         
-        # Generate the PPT file
-        output_path = export_to_ppt(
+        # Render on the renderer pool, then assemble the PPT off the event loop
+        x_data, y_data = chart_series(request.chart_data, request.x_column, request.y_column)
+        chart_image = await render_chart_png_async(
+            x_data, y_data, request.chart_type, request.x_column, request.y_column
+        )
+        output_path = await run_in_threadpool(
+            export_to_ppt,
             chart_data=request.chart_data,
             chart_type=request.chart_type,
             x_column=request.x_column,
-            y_column=request.y_column
+            y_column=request.y_column,
+            chart_image=chart_image
         )
         
         # Verify the file was created
@@ -117,13 +213,93 @@ async def export_chart_to_ppt(request: ExportToPPTRequest):
             
         logger.info(f"Successfully created PPT file at: {output_path}")
         
-        # Return the file directly
+        # Return the file directly and remove it once sent
         return FileResponse(
             path=output_path,
             filename="chart_presentation.pptx",
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            background=BackgroundTask(remove_file, output_path)
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in PPT export: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/report")
+async def create_report(req: ReportRequest):
+    """Render several charts from one dataset into a single PPTX or PDF report."""
+    try:
+        if req.format not in REPORT_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid report format. Must be one of: {', '.join(REPORT_FORMATS)}"
+            )
+        if not req.charts:
+            raise HTTPException(status_code=400, detail="At least one chart is required")
+        if len(req.charts) > MAX_REPORT_CHARTS:
+            raise HTTPException(status_code=400, detail=f"A report can contain at most {MAX_REPORT_CHARTS} charts")
+
+        valid_chart_types = ["bar", "line", "scatter", "pie"]
+        for spec in req.charts:
+            if spec.chart_type not in valid_chart_types:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid chart type. Must be one of: {', '.join(valid_chart_types)}"
+                )
+
+        logger.info(f"Building {req.format} report with {len(req.charts)} charts for file: {req.file_path}")
+
+        # Load the dataset once for every chart in the report, parsing only the charted columns
+        columns = [col for spec in req.charts for col in (spec.x_col, spec.y_col)]
+        parsed_url = urlparse(req.file_path)
+        if parsed_url.scheme in ['http', 'https']:
+            local_path = await run_in_threadpool(download_from_supabase, req.file_path)
+            df = await run_in_threadpool(read_chart_source, local_path, columns)
+        else:
+            if not os.path.exists(req.file_path):
+                raise HTTPException(status_code=404, detail=f"File not found: {req.file_path}")
+            df = await run_in_threadpool(read_chart_source, req.file_path, columns)
+
+        frames = await run_in_threadpool(prepare_report_frames, df, req.charts)
+        del df
+
+        # Render every chart in parallel on the renderer pool
+        dpi = REPORT_PDF_DPI if req.format == "pdf" else CHART_DPI
+        images = await asyncio.gather(*[
+            render_chart_png_async(
+                frame[spec.x_col].tolist(), frame[spec.y_col].tolist(),
+                spec.chart_type, spec.x_col, spec.y_col, dpi
+            )
+            for spec, frame in zip(req.charts, frames)
+        ])
+        charts = [
+            {"image": image, "chart_type": spec.chart_type, "x_col": spec.x_col, "y_col": spec.y_col}
+            for spec, image in zip(req.charts, images)
+        ]
+
+        # Assemble the report in memory and send it in one response
+        if req.format == "pdf":
+            body = await run_in_threadpool(build_report_pdf, charts, dpi)
+        else:
+            title = req.title or "Datanize Chart Report"
+            subtitle = f"{len(charts)} charts from {os.path.basename(parsed_url.path)}"
+            body = await run_in_threadpool(build_report_pptx, charts, title, subtitle)
+
+        media_type, filename = REPORT_FORMATS[req.format]
+        logger.info(f"Built {req.format} report with {len(charts)} charts ({len(body)} bytes)")
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error in report generation: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in report generation: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
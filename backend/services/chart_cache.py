@@ -0,0 +1,55 @@
+import pandas as pd
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class ChartCache:
+    """In-process LRU cache of prepared chart frames, addressed by chart id."""
+
+    def __init__(self, max_entries: int = 64, ttl_seconds: int = 1800):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, frame: pd.DataFrame, chart_type: str, x_col: str, y_col: str) -> str:
+        """Store a prepared chart frame and return its chart id."""
+        chart_id = uuid.uuid4().hex
+        entry = {
+            "frame": frame,
+            "chart_type": chart_type,
+            "x_col": x_col,
+            "y_col": y_col,
+            "created_at": time.monotonic()
+        }
+        with self._lock:
+            self._entries[chart_id] = entry
+            while len(self._entries) > self.max_entries:
+                evicted_id, _ = self._entries.popitem(last=False)
+                logger.info(f"Evicted chart {evicted_id} from chart cache")
+        return chart_id
+
+    def get(self, chart_id: str) -> Optional[Dict[str, Any]]:
+        """Return a cached chart entry, or None if it is unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(chart_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["created_at"] > self.ttl_seconds:
+                del self._entries[chart_id]
+                return None
+            self._entries.move_to_end(chart_id)
+            return entry
+
+    def clear(self) -> None:
+        """Drop every cached chart."""
+        with self._lock:
+            self._entries.clear()
+
+# Initialize the chart cache
+chart_cache = ChartCache()
@@ -0,0 +1,86 @@
+import pandas as pd
+import gzip
+import io
+import json
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import brotli
+import pyarrow as pa
+
+from services.visualization import to_columnar
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_FORMATS = ["records", "columnar", "arrow"]
+COMPRESSIONS = ["gzip", "br"]
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def validate_payload_options(response_format: str, compression: Optional[str]) -> None:
+    """Validate the requested payload format and compression."""
+    if response_format not in PAYLOAD_FORMATS:
+        raise ValueError(f"Invalid response format. Must be one of: {', '.join(PAYLOAD_FORMATS)}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Invalid compression. Must be one of: {', '.join(COMPRESSIONS)}")
+
+def encode_arrow(frame: pd.DataFrame, x_col: str, y_col: str, axis_ranges: Optional[Dict[str, Any]] = None) -> bytes:
+    """Serialise the chart columns as an Arrow IPC stream, with axis ranges in the schema metadata."""
+    table = pa.Table.from_pandas(frame[[x_col, y_col]], preserve_index=False)
+    if axis_ranges is not None:
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"axis_ranges"] = json.dumps(axis_ranges, default=str).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def compress_payload(body: bytes, compression: Optional[str]) -> bytes:
+    """Compress a response body with gzip or brotli."""
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if compression == "br":
+        return brotli.compress(body, quality=5)
+    return body
+
+def encode_json(content: Dict[str, Any], compression: Optional[str]) -> bytes:
+    """Serialise a JSON payload without re-walking it through FastAPI's encoder."""
+    body = json.dumps(content, separators=(",", ":"), default=str).encode("utf-8")
+    return compress_payload(body, compression)
+
+def encoding_headers(compression: Optional[str]) -> Dict[str, str]:
+    """Return the Content-Encoding headers for a compressed payload."""
+    if compression is None:
+        return {}
+    return {"Content-Encoding": compression}
+
+def encode_chart_payload(frame: pd.DataFrame, x_col: str, y_col: str, response_format: str,
+                         compression: Optional[str] = None,
+                         chart_id: Optional[str] = None,
+                         axis_ranges: Optional[Dict[str, Any]] = None) -> Tuple[bytes, str, Dict[str, str]]:
+    """Encode a prepared chart frame, returning the body, media type and headers."""
+    headers = encoding_headers(compression)
+    if chart_id is not None:
+        headers["X-Chart-Id"] = chart_id
+
+    if response_format == "arrow":
+        body = compress_payload(encode_arrow(frame, x_col, y_col, axis_ranges), compression)
+        media_type = ARROW_MEDIA_TYPE
+    else:
+        if response_format == "columnar":
+            chart_data = to_columnar(frame, x_col, y_col)
+        else:
+            chart_data = frame.to_dict('records')
+        body = encode_json({
+            "chart_id": chart_id,
+            "chart_data": chart_data,
+            "axis_ranges": axis_ranges,
+            "format": response_format,
+            "x_col": x_col,
+            "y_col": y_col,
+            "message": "Chart data generated successfully"
+        }, compression)
+        media_type = "application/json"
+
+    logger.info(f"Encoded {len(frame)} chart points as {response_format} ({len(body)} bytes, compression={compression})")
+    return body, media_type, headers
@@ -0,0 +1,93 @@
+import asyncio
+import io
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Any, Optional
+
+import matplotlib
+import matplotlib.cm as cm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+logger = logging.getLogger(__name__)
+
+DARK_BLUE = '#1e40af'  # Tailwind dark blue-700
+CHART_DPI = 300
+RENDER_WORKERS = int(os.getenv("DATANIZE_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _colormap(name: str):
+    """Look up a colormap on both old and new matplotlib versions."""
+    registry = getattr(matplotlib, "colormaps", None)
+    return registry[name] if registry is not None else cm.get_cmap(name)
+
+def render_chart_png(x_data: List[Any], y_data: List[Any], chart_type: str, x_column: str,
+                     y_column: str, dpi: int = CHART_DPI) -> bytes:
+    """Render a chart to PNG bytes using a private Figure, without pyplot state."""
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+
+    if chart_type == "bar":
+        ax.bar(x_data, y_data, color=DARK_BLUE)
+    elif chart_type == "line":
+        ax.plot(x_data, y_data, color=DARK_BLUE, linewidth=2)
+    elif chart_type == "scatter":
+        ax.scatter(x_data, y_data, color=DARK_BLUE)
+    elif chart_type == "pie":
+        # Use a color palette for the pie slices
+        colors = _colormap('tab20').colors
+        ax.pie(y_data, labels=x_data, autopct='%1.1f%%', colors=colors[:len(x_data)])
+    else:
+        raise ValueError(f"Unsupported chart type: {chart_type}")
+
+    ax.set_xlabel(x_column)
+    ax.set_ylabel(y_column)
+    ax.set_title(f"{y_column} vs {x_column}")
+
+    # Handle long labels
+    if chart_type != "pie":
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_horizontalalignment('right')
+
+    # Adjust layout to prevent label cutoff
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=dpi)
+    return buffer.getvalue()
+
+def _warm_up_worker() -> None:
+    """Pay matplotlib's font and backend setup once per worker process."""
+    render_chart_png([0, 1], [0, 1], "line", "x", "y", dpi=10)
+
+def get_renderer_pool() -> ProcessPoolExecutor:
+    """Return the per-process pool of chart rendering workers, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                logger.info(f"Starting chart renderer pool with {RENDER_WORKERS} workers")
+                _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=_warm_up_worker)
+    return _pool
+
+async def render_chart_png_async(x_data: List[Any], y_data: List[Any], chart_type: str,
+                                 x_column: str, y_column: str, dpi: int = CHART_DPI) -> bytes:
+    """Render a chart on the renderer pool without blocking the event loop."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        get_renderer_pool(), render_chart_png, x_data, y_data, chart_type, x_column, y_column, dpi
+    )
+
+def shutdown_renderer_pool() -> None:
+    """Stop the renderer pool's worker processes."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
@@ -0,0 +1,196 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import uuid
+import logging
+from typing import Dict, Any, List, Optional
+
+from services.data_reader import read_dataset
+from utils.file_handler import file_version
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+INDEX_SUFFIX = ".colindex.json"
+HISTOGRAM_BINS = 50
+QUANTILE_BINS = 20
+MAX_CATEGORIES = 100
+SAMPLE_SIZE = 1000
+
+def _index_path(file_path: str) -> str:
+    """Return the path of the on-disk index kept next to the dataset."""
+    return f"{file_path}{INDEX_SUFFIX}"
+
+def _to_builtin(value: Any) -> Any:
+    """Convert numpy/pandas scalars to JSON-serialisable Python values."""
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating,)):
+        return float(value)
+    if isinstance(value, (np.bool_,)):
+        return bool(value)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+def _summarize_numeric(series: pd.Series) -> Dict[str, Any]:
+    """Build histograms, quantiles and a sorted sample for a numeric column."""
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    finite = np.isfinite(values)
+    row_ids = np.flatnonzero(finite)
+    values = values[finite]
+
+    summary = {
+        "kind": "numeric",
+        "dtype": str(series.dtype),
+        "count": int(len(values)),
+        "nulls": int(series.isna().sum()),
+    }
+    if len(values) == 0:
+        return summary
+
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    probs = np.linspace(0, 1, QUANTILE_BINS + 1)
+
+    # Sorted-index sample: evenly spaced positions in sorted order, keeping
+    # the original row ids so callers can map values back to rows.
+    order = np.argsort(values, kind="stable")
+    positions = np.unique(np.linspace(0, len(values) - 1, min(SAMPLE_SIZE, len(values))).astype(int))
+
+    summary.update({
+        "min": float(values[order[0]]),
+        "max": float(values[order[-1]]),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "histogram": {
+            "edges": edges.tolist(),
+            "counts": counts.tolist()
+        },
+        "quantiles": {
+            "probs": probs.tolist(),
+            "values": np.quantile(values, probs).tolist()
+        },
+        "sorted_sample": {
+            "rows": row_ids[order[positions]].tolist(),
+            "values": values[order[positions]].tolist()
+        }
+    })
+    return summary
+
+def _summarize_categorical(series: pd.Series) -> Dict[str, Any]:
+    """Build value counts for a categorical column."""
+    value_counts = series.value_counts(dropna=True)
+    top = value_counts.head(MAX_CATEGORIES)
+    return {
+        "kind": "categorical",
+        "dtype": str(series.dtype),
+        "count": int(series.notna().sum()),
+        "nulls": int(series.isna().sum()),
+        "unique": int(len(value_counts)),
+        "value_counts": {
+            "values": [str(_to_builtin(v)) for v in top.index],
+            "counts": [int(c) for c in top.values],
+            "truncated": len(value_counts) > MAX_CATEGORIES
+        }
+    }
+
+def build_column_index(df: pd.DataFrame) -> Dict[str, Any]:
+    """Build per-column summary structures for a DataFrame."""
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            columns[str(column)] = _summarize_numeric(series)
+        else:
+            columns[str(column)] = _summarize_categorical(series)
+    return {
+        "format_version": INDEX_FORMAT_VERSION,
+        "rows": int(len(df)),
+        "columns": columns
+    }
+
+def load_column_index(file_path: str) -> Optional[Dict[str, Any]]:
+    """Load the cached index for a dataset if it matches the current version."""
+    index_path = _index_path(file_path)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable column index {index_path}: {str(e)}")
+        return None
+    if index.get("format_version") != INDEX_FORMAT_VERSION:
+        return None
+    if index.get("dataset_version") != file_version(file_path):
+        return None
+    return index
+
+def get_column_index(file_path: str, df: Optional[pd.DataFrame] = None, persist: bool = True) -> Dict[str, Any]:
+    """Return the column index for a local dataset, building and caching it if needed."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    index = load_column_index(file_path) if persist else None
+    if index is not None:
+        return index
+
+    version = file_version(file_path)
+    if df is None:
+        df = read_dataset(file_path)
+    index = build_column_index(df)
+    index["dataset_version"] = version
+    logger.info(f"Built column index for {file_path} ({len(index['columns'])} columns)")
+
+    if persist:
+        index_path = _index_path(file_path)
+        # Unique per writer, so a background build and a request can persist at once
+        temp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            logger.warning(f"Failed to persist column index {index_path}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return index
+
+def summarize_columns(index: Dict[str, Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Select column summaries from an index, validating the requested names."""
+    if not columns:
+        return index["columns"]
+    missing = [c for c in columns if c not in index["columns"]]
+    if missing:
+        raise ValueError(f"Columns {', '.join(missing)} not found in the file")
+    return {c: index["columns"][c] for c in columns}
+
+def check_chart_columns(index: Dict[str, Any], x_col: str, y_col: str, chart_type: str) -> None:
+    """Reject a chart the index already shows cannot be drawn, before the file is read."""
+    if index["rows"] == 0:
+        raise ValueError("The input file is empty")
+    if x_col not in index["columns"] or y_col not in index["columns"]:
+        raise ValueError(f"Columns {x_col} and/or {y_col} not found in the file")
+    for column in dict.fromkeys([x_col, y_col]):
+        if index["columns"][column]["count"] == 0:
+            raise ValueError("No valid data points after removing null values")
+    x_summary = index["columns"][x_col]
+    # Rows with a missing y are dropped before counting, so only a complete y column is conclusive
+    if chart_type == "pie" and x_summary["kind"] == "categorical" and index["columns"][y_col]["nulls"] == 0 \
+            and x_summary["unique"] > 10:
+        raise ValueError(f"Pie chart not suitable for {x_summary['unique']} categories. Maximum recommended is 10.")
+
+def axis_ranges(index: Dict[str, Any], x_col: str, y_col: str) -> Dict[str, Any]:
+    """Return each chart axis's full-data extent: min/max when numeric, categories otherwise."""
+    ranges = {}
+    for axis, column in (("x", x_col), ("y", y_col)):
+        summary = index["columns"][column]
+        if summary["kind"] == "numeric":
+            ranges[axis] = {"min": summary.get("min"), "max": summary.get("max")}
+        else:
+            ranges[axis] = {
+                "categories": summary["value_counts"]["values"],
+                "truncated": summary["value_counts"]["truncated"]
+            }
+    return ranges
@@ -0,0 +1,209 @@
+import os
+import logging
+import zipfile
+from typing import Dict, Any, List, Optional, Callable, Iterator, Union
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from services.remote_cache import fetch_remote_file, remote_cache
+from services.workbooks import convert_workbook, find_sheet, sheet_file_path, read_excel_sheet
+from utils.http_client import read_remote_csv
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # the C parser is used instead
+    pa = pa_csv = pq = None
+
+logger = logging.getLogger(__name__)
+
+# "c" is the pandas C parser; "pyarrow" opts in to the multithreaded reader, whose type
+# inference can differ (e.g. which columns come back as object dtype)
+CSV_ENGINE = os.getenv("DATANIZE_CSV_ENGINE", "c")
+SNIFF_BYTES = 8
+
+DATA_FORMATS = ["csv", "csv.gz", "parquet", "xlsx", "xls"]
+EXCEL_FORMATS = ["xlsx", "xls"]
+
+# The values pandas' C parser reads as missing, so both CSV engines agree
+NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
+
+DataSource = Union[pd.DataFrame, Iterator[pd.DataFrame]]
+Reader = Callable[..., DataSource]
+
+_readers: Dict[str, Reader] = {}
+
+def register_reader(data_format: str) -> Callable[[Reader], Reader]:
+    """Register the function that reads one data format."""
+    def decorator(reader: Reader) -> Reader:
+        _readers[data_format] = reader
+        return reader
+    return decorator
+
+def sniff_format(file_path: str) -> str:
+    """Identify a data file's format from its leading bytes rather than its extension."""
+    with open(file_path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.startswith(b"\x1f\x8b"):
+        return "csv.gz"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "xls"
+    if head.startswith(b"PK\x03\x04"):
+        with zipfile.ZipFile(file_path) as archive:
+            if any(name.startswith("xl/") for name in archive.namelist()):
+                return "xlsx"
+        raise ValueError("Unsupported file format: zip archives are not datasets")
+    if b"\x00" in head and not head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        raise ValueError("Unsupported file format: the file is not text, CSV, Excel or Parquet")
+    return "csv"
+
+def _apply_dtypes(df: pd.DataFrame, dtype: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Cast columns to the requested dtypes after an engine that cannot take them directly."""
+    if not dtype:
+        return df
+    return df.astype({column: kind for column, kind in dtype.items() if column in df.columns})
+
+def _check_columns(header: List[str], usecols: Optional[List[str]]) -> None:
+    """Raise a ValueError naming every requested column the file does not have."""
+    if usecols:
+        missing = [c for c in usecols if c not in header]
+        if missing:
+            raise ValueError(f"Columns {', '.join(missing)} not found in the file")
+
+def _is_text_dtype(kind: Any) -> bool:
+    return kind is str or kind == "str" or kind is object or kind == "object"
+
+def _read_csv_pyarrow(file_path: str, usecols: Optional[List[str]], dtype: Optional[Dict[str, Any]],
+                      compression: Optional[str]) -> pd.DataFrame:
+    """Parse a whole CSV with pyarrow's multithreaded reader."""
+    text_columns = {c: pa.string() for c, kind in (dtype or {}).items() if _is_text_dtype(kind)}
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=usecols or [],
+        column_types=text_columns,
+        null_values=NA_VALUES,
+        strings_can_be_null=True,
+        true_values=["True", "TRUE", "true"],
+        false_values=["False", "FALSE", "false"]
+    )
+    source = pa.input_stream(file_path, compression=compression)
+    table = pa_csv.read_csv(source, convert_options=convert_options)
+
+    df = table.to_pandas(date_as_object=False)
+    for field in table.schema:
+        if pa.types.is_null(field.type):
+            # Entirely empty columns come back as NaN floats from the C parser
+            df[field.name] = np.nan
+    remaining = {c: kind for c, kind in (dtype or {}).items() if c not in text_columns}
+    return _apply_dtypes(df, remaining)
+
+@register_reader("csv")
+def read_csv_file(file_path: str, usecols: Optional[List[str]] = None, dtype: Optional[Dict[str, Any]] = None,
+                  chunksize: Optional[int] = None, nrows: Optional[int] = None,
+                  compression: Optional[str] = None, **_) -> DataSource:
+    """Read a CSV with the pandas C parser, or with pyarrow when that engine is selected."""
+    header = pd.read_csv(file_path, nrows=0, compression=compression).columns.tolist()
+    _check_columns(header, usecols)
+
+    if pa_csv is not None and CSV_ENGINE == "pyarrow" and chunksize is None and nrows is None:
+        try:
+            return _read_csv_pyarrow(file_path, usecols, dtype, compression)
+        except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+            logger.info(f"pyarrow could not parse {file_path}, using the C parser: {str(e)}")
+
+    return pd.read_csv(file_path, usecols=usecols, dtype=dtype, chunksize=chunksize, nrows=nrows,
+                       compression=compression)
+
+@register_reader("csv.gz")
+def read_csv_gz_file(file_path: str, **options: Any) -> DataSource:
+    """Read a gzip-compressed CSV."""
+    return read_csv_file(file_path, compression="gzip", **options)
+
+@register_reader("parquet")
+def read_parquet_file(file_path: str, usecols: Optional[List[str]] = None, dtype: Optional[Dict[str, Any]] = None,
+                      chunksize: Optional[int] = None, nrows: Optional[int] = None, **_) -> DataSource:
+    """Read a Parquet file, loading only the requested columns."""
+    if pq is None:
+        raise ValueError("Reading Parquet files requires pyarrow")
+    parquet_file = pq.ParquetFile(file_path)
+    _check_columns(parquet_file.schema_arrow.names, usecols)
+
+    if chunksize is not None:
+        batches = parquet_file.iter_batches(batch_size=chunksize, columns=usecols)
+        return (_apply_dtypes(batch.to_pandas(), dtype) for batch in batches)
+    if nrows is not None:
+        batches = parquet_file.iter_batches(batch_size=max(nrows, 1), columns=usecols)
+        first = next(batches, None)
+        df = first.to_pandas() if first is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+        return _apply_dtypes(df.head(nrows), dtype)
+    return _apply_dtypes(parquet_file.read(columns=usecols).to_pandas(), dtype)
+
+def _read_excel_file(file_path: str, usecols: Optional[List[str]] = None, dtype: Optional[Dict[str, Any]] = None,
+                     chunksize: Optional[int] = None, nrows: Optional[int] = None,
+                     sheet_name: Union[int, str] = 0, **_) -> DataSource:
+    """Read one worksheet of an Excel workbook, from its Parquet copy once converted."""
+    try:
+        manifest = convert_workbook(file_path)
+    except Exception as e:
+        logger.warning(f"Failed to convert workbook {file_path}, reading it directly: {str(e)}")
+        manifest = None
+
+    if manifest is not None:
+        sheet_path = sheet_file_path(file_path, find_sheet(manifest, sheet_name))
+        return read_parquet_file(sheet_path, usecols=usecols, dtype=dtype, chunksize=chunksize, nrows=nrows)
+
+    df = read_excel_sheet(file_path, sheet_name=sheet_name, nrows=nrows, dtype=dtype)
+    _check_columns(df.columns.tolist(), usecols)
+    if usecols:
+        df = df[usecols]
+    if chunksize is not None:
+        return (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+    return df
+
+register_reader("xlsx")(_read_excel_file)
+register_reader("xls")(_read_excel_file)
+
+def resolve_local_path(file_path: str) -> str:
+    """Return a local path for a dataset, fetching remote URLs through the remote cache."""
+    if urlparse(file_path).scheme in ['http', 'https']:
+        return fetch_remote_file(file_path)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    return file_path
+
+def read_dataset(file_path: str, usecols: Optional[List[str]] = None, dtype: Optional[Dict[str, Any]] = None,
+                 chunksize: Optional[int] = None, nrows: Optional[int] = None, **options: Any) -> DataSource:
+    """Read a local or remote dataset with the fastest parser available for its format.
+
+    The format is sniffed from the file's leading bytes. ``usecols`` limits
+    the columns that are parsed, ``dtype`` maps columns to dtypes, and
+    ``chunksize`` returns an iterator of DataFrames instead of one frame.
+    """
+    parsed_url = urlparse(file_path)
+    if parsed_url.scheme in ['http', 'https'] and not remote_cache.enabled and chunksize is None \
+            and not parsed_url.path.endswith(('.xlsx', '.xls', '.parquet')):
+        # Nothing is kept on disk, so parse the CSV as it arrives
+        return read_remote_csv(file_path, usecols=usecols, dtype=dtype, nrows=nrows)
+
+    local_path = resolve_local_path(file_path)
+    data_format = sniff_format(local_path)
+    reader = _readers.get(data_format)
+    if reader is None:
+        raise ValueError(f"Unsupported file format: {data_format}")
+    return reader(local_path, usecols=usecols, dtype=dtype, chunksize=chunksize, nrows=nrows, **options)
+
+def read_header(file_path: str) -> List[str]:
+    """Return a dataset's column names, parsing as little of the file as possible."""
+    local_path = resolve_local_path(file_path)
+    data_format = sniff_format(local_path)
+    if data_format == "parquet" and pq is not None:
+        return pq.ParquetFile(local_path).schema_arrow.names
+    return read_dataset(local_path, nrows=0).columns.tolist()
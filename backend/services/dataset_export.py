@@ -0,0 +1,197 @@
+import os
+import json
+import random
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from services.yolo_service import is_ignored_label
+from utils.yaml_stream import dump_yaml
+
+logger = logging.getLogger(__name__)
+
+DATASET_FORMATS = ["yolo", "coco"]
+EXPORT_WORKERS = int(os.getenv("DATANIZE_EXPORT_WORKERS", "8"))
+
+def _image_name(image_url: str) -> str:
+    return os.path.basename(urlparse(image_url).path)
+
+def check_image_references(images: List[str]) -> None:
+    """Reject image references that could reach files outside the search directories."""
+    for image_url in images:
+        if urlparse(image_url).scheme in ['http', 'https']:
+            continue
+        if os.path.isabs(image_url) or ".." in Path(image_url.replace("\\", "/")).parts:
+            raise ValueError(f"Image path must be relative to the uploads directory: {image_url}")
+
+def _resolve_image(image_url: str, search_dirs: List[str]) -> Optional[str]:
+    """Find an image inside the search directories, by its relative path or its file name.
+
+    URLs are matched by file name only; nothing is fetched from the network.
+    """
+    candidates = [_image_name(image_url)]
+    if urlparse(image_url).scheme not in ['http', 'https']:
+        candidates.insert(0, image_url)
+    for directory in search_dirs:
+        root = os.path.realpath(directory)
+        for candidate in candidates:
+            if not candidate:
+                continue
+            path = os.path.realpath(os.path.join(root, candidate))
+            if os.path.commonpath([path, root]) == root and os.path.isfile(path):
+                return path
+    return None
+
+def _unique_names(images: List[str]) -> List[str]:
+    """Name each image after its file, prefixing the index when two share a stem.
+
+    Label files are named after the stem, so a.jpg and a.png must not collide either.
+    """
+    names = [_image_name(image_url) or f"image_{index}" for index, image_url in enumerate(images)]
+    counts: Dict[str, int] = {}
+    for name in names:
+        counts[Path(name).stem] = counts.get(Path(name).stem, 0) + 1
+    return [f"{index}_{name}" if counts[Path(name).stem] > 1 else name for index, name in enumerate(names)]
+
+def assign_splits(count: int, val_split: float, random_state: Optional[int]) -> List[str]:
+    """Assign each image to "train" or "val", with ``val_split`` of them held out."""
+    if not 0 <= val_split < 1:
+        raise ValueError("val_split must be at least 0 and less than 1")
+    splits = ["train"] * count
+    val_count = int(round(count * val_split))
+    for index in random.Random(random_state).sample(range(count), val_count):
+        splits[index] = "val"
+    return splits
+
+def class_names(labels: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    """Collect the class names used by any kept object, in a stable order."""
+    return sorted({obj["label"] for objects in labels.values() for obj in objects if not is_ignored_label(obj["label"])})
+
+def _prepare_image(image_url: str, objects: List[Dict[str, Any]], search_dirs: List[str],
+                   include_images: bool) -> Dict[str, Any]:
+    """Locate one image and read its size from the header; runs on the export pool."""
+    path = width = height = None
+    try:
+        path = _resolve_image(image_url, search_dirs)
+        if path is not None:
+            with Image.open(path) as image:
+                width, height = image.size
+    except Exception as e:
+        logger.warning(f"Failed to read image {image_url}: {str(e)}")
+        path = None
+    if path is None:
+        logger.warning(f"Image {image_url} not found; leaving it out of the export")
+    return {
+        "found": path is not None,
+        "path": path if include_images else None,
+        "width": width,
+        "height": height,
+        "objects": [obj for obj in objects if not is_ignored_label(obj["label"])]
+    }
+
+def _iter_prepared(images: List[str], labels: Dict[str, List[Dict[str, Any]]], search_dirs: List[str],
+                   include_images: bool) -> Iterator[Dict[str, Any]]:
+    """Prepare images in parallel and yield them in order, with a bounded number queued."""
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="dataset-export") as pool:
+        pending = deque()
+        for index, image_url in enumerate(images):
+            pending.append(pool.submit(_prepare_image, image_url, labels.get(str(index), []), search_dirs, include_images))
+            if len(pending) >= EXPORT_WORKERS * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _clip(value: float) -> float:
+    return min(max(value, 0.0), 1.0)
+
+def yolo_label_lines(objects: List[Dict[str, Any]], class_ids: Dict[str, int]) -> str:
+    """Convert percentage xyxy boxes into YOLO "class cx cy w h" lines, normalised to 0-1."""
+    lines = []
+    for obj in objects:
+        x1, y1, x2, y2 = (_clip(value / 100) for value in obj["bbox"])
+        lines.append(
+            f"{class_ids[obj['label']]} {(x1 + x2) / 2:.6f} {(y1 + y2) / 2:.6f} {x2 - x1:.6f} {y2 - y1:.6f}"
+        )
+    return "\n".join(lines) + ("\n" if lines else "")
+
+def iter_yolo_entries(images: List[str], labels: Dict[str, List[Dict[str, Any]]], splits: List[str],
+                      search_dirs: List[str], include_images: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yield zip entries for an ultralytics dataset: data.yaml, images/<split>/ and labels/<split>/."""
+    names = class_names(labels)
+    class_ids = {name: class_id for class_id, name in enumerate(names)}
+    data_yaml = {
+        "path": ".",
+        "train": "images/train",
+        # ultralytics needs a validation set; without a split it validates on the training images
+        "val": "images/val" if "val" in splits else "images/train",
+        "nc": len(names),
+        "names": names
+    }
+    yield {"arcname": "data.yaml", "chunks": [dump_yaml(data_yaml, sort_keys=False).encode("utf-8")]}
+
+    for name, split, prepared in zip(_unique_names(images), splits, _iter_prepared(images, labels, search_dirs, include_images)):
+        if not prepared["found"]:
+            continue
+        if prepared["path"] is not None:
+            yield {"arcname": f"images/{split}/{name}", "path": prepared["path"]}
+        lines = yolo_label_lines(prepared["objects"], class_ids)
+        yield {"arcname": f"labels/{split}/{Path(name).stem}.txt", "chunks": [lines.encode("utf-8")]}
+
+def iter_coco_entries(images: List[str], labels: Dict[str, List[Dict[str, Any]]], splits: List[str],
+                      search_dirs: List[str], include_images: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yield zip entries for a COCO dataset: images/<split>/ and annotations/instances_<split>.json."""
+    names = class_names(labels)
+    categories = [{"id": class_id, "name": name, "supercategory": "object"} for class_id, name in enumerate(names, start=1)]
+    category_ids = {category["name"]: category["id"] for category in categories}
+    coco: Dict[str, Dict[str, list]] = {split: {"images": [], "annotations": []} for split in sorted(set(splits))}
+    annotation_id = 1
+
+    for image_id, (name, split, prepared) in enumerate(
+            zip(_unique_names(images), splits, _iter_prepared(images, labels, search_dirs, include_images)), start=1):
+        width, height = prepared["width"], prepared["height"]
+        if width is None:
+            # COCO boxes are in pixels, which needs the image's size
+            logger.warning(f"Skipping {name} in the COCO export: image size unknown")
+            continue
+        if prepared["path"] is not None:
+            yield {"arcname": f"images/{split}/{name}", "path": prepared["path"]}
+
+        coco[split]["images"].append({"id": image_id, "file_name": name, "width": width, "height": height})
+        for obj in prepared["objects"]:
+            x1, y1, x2, y2 = (_clip(value / 100) for value in obj["bbox"])
+            box = [x1 * width, y1 * height, (x2 - x1) * width, (y2 - y1) * height]
+            coco[split]["annotations"].append({
+                "id": annotation_id,
+                "image_id": image_id,
+                "category_id": category_ids[obj["label"]],
+                "bbox": [round(value, 2) for value in box],
+                "area": round(box[2] * box[3], 2),
+                "iscrowd": 0
+            })
+            annotation_id += 1
+
+    for split, records in coco.items():
+        document = {"images": records["images"], "annotations": records["annotations"], "categories": categories}
+        yield {"arcname": f"annotations/instances_{split}.json", "chunks": [json.dumps(document).encode("utf-8")]}
+
+def iter_dataset_entries(images: List[str], labels: Dict[str, List[Dict[str, Any]]], dataset_format: str,
+                         val_split: float = 0.0, random_state: Optional[int] = 42,
+                         search_dirs: Optional[List[str]] = None, include_images: bool = True) -> Iterator[Dict[str, Any]]:
+    """Describe a labelled dataset in YOLO or COCO layout as zip entries, for ``iter_zip``.
+
+    ``labels`` maps each image's index (as a string) to its objects, each with
+    a ``label`` and a percentage xyxy ``bbox``; 'None', 'NA' and 'N/A' objects
+    are dropped. Images are looked up under ``search_dirs`` only and
+    located and measured in parallel; images that are not found are left out.
+    """
+    if dataset_format not in DATASET_FORMATS:
+        raise ValueError(f"Invalid dataset format. Must be one of: {', '.join(DATASET_FORMATS)}")
+    check_image_references(images)
+    splits = assign_splits(len(images), val_split, random_state)
+    exporter = iter_yolo_entries if dataset_format == "yolo" else iter_coco_entries
+    return exporter(images, labels, splits, search_dirs or [], include_images)
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DETECTION_CACHE_MAX_BYTES = int(os.getenv("DATANIZE_DETECTION_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+# Kept outside uploads/, which is served publicly; set to an empty string to keep detections in memory only
+DETECTION_CACHE_DB = os.getenv("DATANIZE_DETECTION_CACHE_DB", os.path.join(BASE_DIR, "cache", "detection_cache.sqlite3"))
+DETECTION_CACHE_MAX_ROWS = int(os.getenv("DATANIZE_DETECTION_CACHE_MAX_ROWS", "500000"))
+PRUNE_EVERY = 1000
+
+def detection_key(content_hash: str, namespace: str) -> str:
+    """Key detections by image content and by the model and thresholds that produced them."""
+    return f"{namespace}|{content_hash}"
+
+class DetectionCache:
+    """LRU cache of detections by content hash, bounded in bytes and backed by SQLite.
+
+    Entries are kept in memory up to ``max_bytes`` of serialised detections
+    and evicted least-recently-used first. Every entry is also written to a
+    SQLite database when ``db_path`` is set, so images seen before a restart
+    are served without running the model again.
+    """
+
+    def __init__(self, max_bytes: int = DETECTION_CACHE_MAX_BYTES, db_path: Optional[str] = DETECTION_CACHE_DB,
+                 max_rows: int = DETECTION_CACHE_MAX_ROWS):
+        self.max_bytes = max_bytes
+        self.db_path = db_path or None
+        self.max_rows = max_rows
+        self._entries: "OrderedDict[str, Tuple[List[Dict[str, Any]], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the database on first use; persistence is switched off if it cannot be opened."""
+        if self.db_path is None:
+            return None
+        if self._db is None:
+            try:
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                db = sqlite3.connect(self.db_path, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS detections ("
+                    "key TEXT PRIMARY KEY, detections TEXT NOT NULL, last_used REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS detections_last_used ON detections (last_used)")
+                db.commit()
+                self._db = db
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open detection cache {self.db_path}, keeping it in memory: {str(e)}")
+                self.db_path = None
+                return None
+        return self._db
+
+    def _remember(self, key: str, detections: List[Dict[str, Any]], size: int) -> None:
+        """Insert into the in-memory LRU and evict down to the byte cap. Caller holds the lock."""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (detections, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return cached detections, looking on disk when they are not in memory."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return None
+            try:
+                row = db.execute("SELECT detections FROM detections WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                db.execute("UPDATE detections SET last_used = ? WHERE key = ?", (time.time(), key))
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Detection cache lookup failed: {str(e)}")
+                return None
+
+        detections = json.loads(row[0])
+        with self._lock:
+            self._remember(key, detections, len(row[0]))
+        return detections
+
+    def put(self, key: str, detections: List[Dict[str, Any]]) -> None:
+        """Cache detections in memory and, when enabled, on disk."""
+        payload = json.dumps(detections)
+        with self._lock:
+            self._remember(key, detections, len(payload))
+
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO detections (key, detections, last_used) VALUES (?, ?, ?)",
+                    (key, payload, time.time())
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune(db)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist detections: {str(e)}")
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        """Drop the least recently used rows once the database holds more than ``max_rows``."""
+        excess = db.execute("SELECT COUNT(*) FROM detections").fetchone()[0] - self.max_rows
+        if excess > 0:
+            db.execute(
+                "DELETE FROM detections WHERE key IN "
+                "(SELECT key FROM detections ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Pruned {excess} entries from the detection cache")
+
+    def clear(self) -> None:
+        """Drop every cached detection, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        with self._db_lock:
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM detections")
+                db.commit()
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+# Initialize the detection cache
+detection_cache = DetectionCache()
@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import numpy as np
+from PIL import Image, ImageOps, features
+
+from utils.file_handler import cached_file_sha256
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+UPLOADS_ROOT = os.path.join(BASE_DIR, "uploads")
+INGEST_DIR = os.getenv("DATANIZE_INGEST_DIR", os.path.join(UPLOADS_ROOT, "ingest"))
+# Derived files are pruned least-recently-used first once they exceed this many bytes
+INGEST_MAX_BYTES = int(os.getenv("DATANIZE_INGEST_MAX_BYTES", str(2 * 1024 ** 3)))
+# New ingests between two size checks of the ingest directory
+INGEST_PRUNE_EVERY = 100
+# Entries used this recently are never pruned, so a request never loses files it is about to read
+INGEST_PRUNE_GRACE_SECONDS = 300
+THUMBNAIL_SIZE = int(os.getenv("DATANIZE_THUMBNAIL_SIZE", "320"))
+THUMBNAIL_QUALITY = 80
+# Pillow builds without libwebp fall back to JPEG previews
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_MEDIA_TYPE = "image/webp" if THUMBNAIL_FORMAT == "WEBP" else "image/jpeg"
+THUMBNAIL_FILE = "thumbnail.webp" if THUMBNAIL_FORMAT == "WEBP" else "thumbnail.jpg"
+
+_prune_lock = threading.Lock()
+_ingests_since_prune = INGEST_PRUNE_EVERY
+
+def _ingest_dir(content_hash: str) -> str:
+    return os.path.join(INGEST_DIR, content_hash[:2], content_hash)
+
+def _model_input_file(model_size: int) -> str:
+    return f"input_{model_size}.npy"
+
+def _write_atomically(path: str, write) -> None:
+    """Write to a temporary name and rename, so concurrent ingests never see half a file."""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _save_array(path: str, pixels: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, pixels)
+
+def _entry_size(path: str) -> int:
+    size = 0
+    for name in os.listdir(path):
+        try:
+            size += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return size
+
+def prune_ingest_dir(max_bytes: int = INGEST_MAX_BYTES) -> int:
+    """Delete the least recently used ingested images until the directory fits ``max_bytes``.
+
+    Returns the number of bytes freed.
+    """
+    entries = []
+    if not os.path.isdir(INGEST_DIR):
+        return 0
+    for shard in os.listdir(INGEST_DIR):
+        shard_dir = os.path.join(INGEST_DIR, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in os.listdir(shard_dir):
+            path = os.path.join(shard_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), _entry_size(path), path))
+            except OSError:
+                continue
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    cutoff = time.time() - INGEST_PRUNE_GRACE_SECONDS
+    for used_at, size, path in sorted(entries):
+        if total - freed <= max_bytes or used_at >= cutoff:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        freed += size
+    if freed:
+        logger.info(f"Pruned {freed} bytes of ingested images from {INGEST_DIR}")
+    return freed
+
+def _after_ingest() -> None:
+    """Check the ingest directory's size every ``INGEST_PRUNE_EVERY`` new ingests."""
+    global _ingests_since_prune
+    with _prune_lock:
+        _ingests_since_prune += 1
+        if _ingests_since_prune < INGEST_PRUNE_EVERY:
+            return
+        _ingests_since_prune = 0
+        try:
+            prune_ingest_dir()
+        except OSError as e:
+            logger.warning(f"Failed to prune {INGEST_DIR}: {str(e)}")
+
+def ingest_image(image_path: str, model_size: int, content_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Decode an image once into a model-sized array and a web thumbnail, cached by content.
+
+    The model input keeps the aspect ratio with its long side at
+    ``model_size`` and is stored as BGR, the ultralytics convention for
+    arrays, so normalised detections match those on the original. Images
+    with the same content share one set of derived files, and the least
+    recently used are pruned once they exceed ``INGEST_MAX_BYTES``.
+    """
+    content_hash = content_hash or cached_file_sha256(image_path)
+    target_dir = _ingest_dir(content_hash)
+    model_input_path = os.path.join(target_dir, _model_input_file(model_size))
+    thumbnail_path = os.path.join(target_dir, THUMBNAIL_FILE)
+
+    if not (os.path.exists(model_input_path) and os.path.exists(thumbnail_path)):
+        os.makedirs(target_dir, exist_ok=True)
+        with Image.open(image_path) as opened:
+            # JPEGs decode straight at a reduced scale no smaller than the model input
+            opened.draft("RGB", (model_size, model_size))
+            # Camera photos carry their rotation in EXIF, as OpenCV applies it on read
+            image = ImageOps.exif_transpose(opened).convert("RGB")
+
+        model_image = image.copy()
+        model_image.thumbnail((model_size, model_size), Image.BILINEAR)
+        pixels = np.ascontiguousarray(np.asarray(model_image)[..., ::-1])
+        _write_atomically(model_input_path, lambda path: _save_array(path, pixels))
+
+        # The model-sized copy is already decoded and small, so the preview is cut from it
+        preview = (model_image if model_size >= THUMBNAIL_SIZE else image).copy()
+        preview.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+        _write_atomically(
+            thumbnail_path,
+            lambda path: preview.save(path, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        )
+        logger.info(f"Ingested {image_path} ({image.width}x{image.height}) as {content_hash}")
+        _after_ingest()
+    else:
+        # The directory's mtime records when the entry was last used
+        try:
+            os.utime(target_dir)
+        except OSError:
+            pass
+
+    return {
+        "content_hash": content_hash,
+        "model_input": model_input_path,
+        "thumbnail": thumbnail_path
+    }
+
+def load_model_input(ingested: Dict[str, Any]) -> np.ndarray:
+    """Load the cached model-sized pixels of an ingested image."""
+    return np.load(ingested["model_input"])
+
+def public_url(path: str) -> Optional[str]:
+    """Return the /uploads URL of a derived file, or None when it lives outside uploads."""
+    relative = os.path.relpath(path, UPLOADS_ROOT)
+    if relative.startswith(".."):
+        return None
+    return f"/uploads/{Path(relative).as_posix()}"
@@ -0,0 +1,240 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from services.model_registry import model_registry, DEFAULT_MODEL, WARMUP_IMAGE_SIZE
+from services.onnx_backend import export_onnx
+from utils.file_handler import file_version
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = int(os.getenv("DATANIZE_INFER_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("DATANIZE_INFER_MAX_WAIT_MS", "10"))
+# Requests waiting for a batch; beyond this, non-blocking submits are refused
+MAX_QUEUE_SIZE = int(os.getenv("DATANIZE_INFER_MAX_QUEUE", "64"))
+# Seconds a refused client is asked to wait before retrying
+RETRY_AFTER_SECONDS = 1
+# Defaults match ultralytics' own prediction defaults
+CONFIDENCE_THRESHOLD = float(os.getenv("DATANIZE_YOLO_CONF", "0.25"))
+IOU_THRESHOLD = float(os.getenv("DATANIZE_YOLO_IOU", "0.7"))
+IMAGE_SIZE = int(os.getenv("DATANIZE_YOLO_IMGSZ", "640"))
+# "torch" runs the ultralytics model; "onnx" and "onnx-int8" run an ONNX export on ONNX Runtime
+INFERENCE_BACKENDS = ["torch", "onnx", "onnx-int8"]
+INFERENCE_BACKEND = os.getenv("DATANIZE_INFERENCE_BACKEND", "torch")
+
+_STOP = object()
+
+class InferenceQueueFull(Exception):
+    """Raised when a detection cannot be queued because too many are already waiting."""
+
+def parse_result(result) -> List[Dict[str, Any]]:
+    """Convert one YOLO result into detections with percentage xyxy boxes."""
+    detections = []
+    if result.boxes is None:
+        return detections
+    for box in result.boxes:
+        try:
+            # Get normalized coordinates and convert to percentages
+            x1, y1, x2, y2 = box.xyxyn[0].tolist()
+            class_id = int(box.cls[0]) if box.cls is not None else -1
+            detections.append({
+                'label': result.names.get(class_id, "Unknown"),
+                'confidence': float(box.conf[0]) if box.conf is not None else 0.0,
+                'bbox': [
+                    float(x1) * 100,
+                    float(y1) * 100,
+                    float(x2) * 100,
+                    float(y2) * 100
+                ]
+            })
+        except Exception as e:
+            logger.warning(f"Error processing detection box: {str(e)}")
+            continue
+    return detections
+
+class InferenceScheduler:
+    """Queue of detection requests served in micro-batches by one worker thread.
+
+    The worker waits for a first request, then gathers more until it has
+    ``max_batch_size`` images or ``max_wait_ms`` has passed, runs a single
+    batched forward pass and resolves each request's future with its
+    detections. Latency is bounded by the wait window plus one batch, and
+    the queue holds at most ``max_queue_size`` waiting requests.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, conf: float = CONFIDENCE_THRESHOLD,
+                 iou: float = IOU_THRESHOLD, image_size: int = IMAGE_SIZE, backend: str = INFERENCE_BACKEND,
+                 max_queue_size: int = MAX_QUEUE_SIZE):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Invalid inference backend. Must be one of: {', '.join(INFERENCE_BACKENDS)}")
+        self.model_path = model_path
+        self.backend = backend
+        self._model_source: Optional[str] = None
+        self._weights_path: Optional[str] = None
+        self.conf = conf
+        self.iou = iou
+        self.image_size = image_size
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._stopping = False
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def weights_path(self) -> str:
+        """Return the local weights file, loading the model first when it is still to be downloaded."""
+        path = self._weights_path
+        if path is None:
+            path = self.model_path
+            if not os.path.exists(path):
+                # Hub names such as yolov8n.pt are downloaded on first load; the model knows where to
+                model = model_registry.get(self.model_path)
+                path = getattr(model, "ckpt_path", None) or path
+            self._weights_path = path
+        return path
+
+    @property
+    def namespace(self) -> str:
+        """Identify the model weights and thresholds, so cached detections are never reused across them."""
+        path = self.weights_path()
+        version = file_version(path) if os.path.exists(path) else "unversioned"
+        return (f"{self.model_path}@{version}|{self.backend}"
+                f"|conf={self.conf}|iou={self.iou}|imgsz={self.image_size}")
+
+    def set_backend(self, backend: str) -> None:
+        """Switch between the torch and ONNX Runtime backends for later batches."""
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Invalid inference backend. Must be one of: {', '.join(INFERENCE_BACKENDS)}")
+        self.backend = backend
+        self._model_source = None
+
+    def model_source(self) -> str:
+        """Return the weights the backend runs, exporting to ONNX on first use."""
+        source = self._model_source
+        if source is None:
+            if self.backend == "torch":
+                source = self.model_path
+            else:
+                source = export_onnx(self.model_path, int8=self.backend == "onnx-int8", image_size=self.image_size)
+            self._model_source = source
+        return source
+
+    def predict(self, images: List[Any]) -> List[List[Dict[str, Any]]]:
+        """Run one batched forward pass and return each image's detections."""
+        model = model_registry.get(self.model_source())
+        if hasattr(model, "detect_batch"):
+            return model.detect_batch(images, conf=self.conf, iou=self.iou, image_size=self.image_size)
+        results = model(images, conf=self.conf, iou=self.iou, imgsz=self.image_size, verbose=False)
+        return [parse_result(result) for result in results]
+
+    def warm_up(self) -> None:
+        """Load the backend's model and run one tiny batch so the first request is not slow."""
+        self.predict([np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)])
+        logger.info(f"Inference backend {self.backend} warmed up")
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping = False
+                self._worker = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+                self._worker.start()
+
+    def submit(self, image: Any, block: bool = True) -> Future:
+        """Queue an image (path or array) and return a future for its detections.
+
+        When the queue is full, waits for room, or raises InferenceQueueFull
+        straight away if ``block`` is False.
+        """
+        future: Future = Future()
+        self._ensure_worker()
+        try:
+            self._queue.put((image, future), block=block)
+        except queue.Full:
+            raise InferenceQueueFull(f"{self._queue.maxsize} detections are already queued")
+        return future
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def detect(self, image: Any) -> List[Dict[str, Any]]:
+        """Detect objects in one image, blocking until its batch has run."""
+        return self.submit(image).result()
+
+    async def detect_async(self, image: Any) -> List[Dict[str, Any]]:
+        """Detect objects in one image without blocking the event loop; refused when the queue is full."""
+        return await asyncio.wrap_future(self.submit(image, block=False))
+
+    def _next_batch(self) -> Optional[List[Tuple[Any, Future]]]:
+        """Block for one request, then collect more until the batch is full or the wait is over."""
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then stop
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run_batch(self, batch: List[Tuple[Any, Future]]) -> None:
+        # Skip requests whose caller has already given up
+        batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            detections = self.predict([image for image, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # One unreadable image should not fail the others, so retry them one at a time
+            logger.warning(f"Batched detection of {len(batch)} images failed, retrying singly: {str(e)}")
+            for image, future in batch:
+                try:
+                    future.set_result(self.predict([image])[0])
+                except Exception as single_error:
+                    logger.error(f"Detection failed: {str(single_error)}")
+                    future.set_exception(single_error)
+            return
+        for (_, future), image_detections in zip(batch, detections):
+            future.set_result(image_detections)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+            if self._stopping:
+                return
+
+    def shutdown(self) -> None:
+        """Stop the worker once the requests already queued have been served."""
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None and worker.is_alive():
+            self._queue.put(_STOP)
+            worker.join(timeout=30)
+
+# Initialize the inference scheduler
+inference_scheduler = InferenceScheduler()
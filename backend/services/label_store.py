@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+# Kept outside uploads/, which is served publicly
+LABEL_DB = os.getenv("DATANIZE_LABEL_DB", os.path.join(BASE_DIR, "cache", "labels.sqlite3"))
+WRITE_BATCH_SIZE = int(os.getenv("DATANIZE_LABEL_WRITE_BATCH", "256"))
+DEFAULT_PROJECT = "default"
+READ_BATCH_SIZE = 500
+BUSY_TIMEOUT_SECONDS = 30
+
+_STOP = object()
+
+class LabelStore:
+    """Append-only SQLite store of saved labels, shared safely by threads and worker processes.
+
+    The database runs in WAL mode, so exports read while labels are being
+    written. Saves are queued to one writer thread, which commits whatever
+    has accumulated (up to ``batch_size`` entries) in a single transaction
+    and then resolves each save's future.
+    """
+
+    def __init__(self, db_path: str = LABEL_DB, batch_size: int = WRITE_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _initialise(self) -> None:
+        """Create the database and its indexes on first use. Caller holds the lock."""
+        if self._initialised:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS labels ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "project TEXT NOT NULL, "
+                "image_path TEXT NOT NULL, "
+                "labels TEXT NOT NULL, "
+                "detections TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS labels_project_image ON labels (project, image_path)")
+            db.execute("CREATE INDEX IF NOT EXISTS labels_image ON labels (image_path)")
+            db.commit()
+        finally:
+            db.close()
+        self._initialised = True
+
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            self._initialise()
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="label-writer", daemon=True)
+                self._writer.start()
+
+    def save(self, image_path: str, labels: Dict[str, Any], detections: List[Dict[str, Any]],
+             project: str = DEFAULT_PROJECT) -> Future:
+        """Queue one image's labels; the future resolves with the entry id once it is committed."""
+        row = (project, image_path, json.dumps(labels), json.dumps(detections), time.time())
+        future: Future = Future()
+        self._ensure_writer()
+        self._queue.put((row, future))
+        return future
+
+    def _next_batch(self) -> Optional[List[Tuple[tuple, Future]]]:
+        """Block for one save, then take whatever else is already queued."""
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _write_batch(self, db: sqlite3.Connection, batch: List[Tuple[tuple, Future]]) -> None:
+        try:
+            ids = []
+            with db:
+                for row, _ in batch:
+                    cursor = db.execute(
+                        "INSERT INTO labels (project, image_path, labels, detections, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        row
+                    )
+                    ids.append(cursor.lastrowid)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} label entries: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), entry_id in zip(batch, ids):
+            future.set_result(entry_id)
+
+    def _run(self) -> None:
+        db = self._connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._write_batch(db, batch)
+        finally:
+            db.close()
+
+    def _read(self, query: str, params: tuple) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            self._initialise()
+        db = self._connect()
+        try:
+            cursor = db.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(READ_BATCH_SIZE)
+                if not rows:
+                    return
+                for entry_id, project, image_path, labels, detections, created_at in rows:
+                    yield {
+                        "id": entry_id,
+                        "project": project,
+                        "image_path": image_path,
+                        "labels": json.loads(labels),
+                        "detections": json.loads(detections),
+                        "created_at": created_at
+                    }
+        finally:
+            db.close()
+
+    def iter_labels(self, project: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield saved entries in the order they were saved, optionally for one project only."""
+        columns = "SELECT id, project, image_path, labels, detections, created_at FROM labels"
+        if project is None:
+            return self._read(f"{columns} ORDER BY id", ())
+        return self._read(f"{columns} WHERE project = ? ORDER BY id", (project,))
+
+    def image_labels(self, image_path: str, project: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return every entry saved for one image, oldest first."""
+        columns = "SELECT id, project, image_path, labels, detections, created_at FROM labels"
+        if project is None:
+            return list(self._read(f"{columns} WHERE image_path = ? ORDER BY id", (image_path,)))
+        return list(self._read(f"{columns} WHERE project = ? AND image_path = ? ORDER BY id", (project, image_path)))
+
+    def count(self, project: Optional[str] = None) -> int:
+        with self._lock:
+            self._initialise()
+        db = self._connect()
+        try:
+            if project is None:
+                return db.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+            return db.execute("SELECT COUNT(*) FROM labels WHERE project = ?", (project,)).fetchone()[0]
+        finally:
+            db.close()
+
+    def close(self) -> None:
+        """Stop the writer once every queued save has been committed."""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None and writer.is_alive():
+            self._queue.put(_STOP)
+            writer.join(timeout=30)
+
+# Initialize the label store
+label_store = LabelStore()
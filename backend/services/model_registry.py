@@ -0,0 +1,139 @@
+import os
+import gc
+import sys
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("DATANIZE_YOLO_MODEL", "yolov8n.pt")
+# Unload models unused for this long; 0 keeps them loaded for the life of the process
+MODEL_IDLE_SECONDS = float(os.getenv("DATANIZE_MODEL_IDLE_SECONDS", "900"))
+MODEL_WARMUP = os.getenv("DATANIZE_MODEL_WARMUP", "false").lower() in ("1", "true", "yes")
+WARMUP_IMAGE_SIZE = 64
+
+class ModelRegistry:
+    """Process-wide holder of YOLO models, loaded lazily and shared by every caller.
+
+    torch and ultralytics are only imported when a model is first needed, so
+    requests that never touch images do not pay for them. Models idle for
+    longer than ``idle_seconds`` are unloaded by a background reaper thread.
+    """
+
+    def __init__(self, idle_seconds: float = MODEL_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._models: Dict[str, Any] = {}
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _load(self, model_path: str) -> Any:
+        """Import ultralytics (or ONNX Runtime, for .onnx exports) and load one model."""
+        logger.info(f"Loading YOLO model {model_path}...")
+        started = time.monotonic()
+        if model_path.endswith(".onnx"):
+            from services.onnx_backend import OnnxDetector
+
+            model = OnnxDetector(model_path)
+        else:
+            from ultralytics import YOLO
+
+            model = YOLO(model_path)
+        logger.info(f"YOLO model {model_path} loaded in {time.monotonic() - started:.2f}s")
+        return model
+
+    def get(self, model_path: str = DEFAULT_MODEL) -> Any:
+        """Return a loaded model, loading it on first use."""
+        with self._lock:
+            model = self._models.get(model_path)
+            if model is not None:
+                self._last_used[model_path] = time.monotonic()
+                return model
+            load_lock = self._load_locks.setdefault(model_path, threading.Lock())
+
+        # Load outside the registry lock so other models stay available meanwhile
+        with load_lock:
+            with self._lock:
+                model = self._models.get(model_path)
+            if model is None:
+                try:
+                    model = self._load(model_path)
+                except Exception as e:
+                    logger.error(f"Failed to load YOLO model: {str(e)}")
+                    raise RuntimeError(f"Failed to load YOLO model: {str(e)}")
+                with self._lock:
+                    self._models[model_path] = model
+                    self._last_used[model_path] = time.monotonic()
+                self._start_reaper()
+        return model
+
+    def is_loaded(self, model_path: str = DEFAULT_MODEL) -> bool:
+        with self._lock:
+            return model_path in self._models
+
+    def warm_up(self, model_path: str = DEFAULT_MODEL) -> None:
+        """Load a model and run one tiny inference so the first request is not slow."""
+        import numpy as np
+
+        model = self.get(model_path)
+        image = np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+        if hasattr(model, "detect_batch"):
+            model.detect_batch([image])
+        else:
+            model(image, verbose=False)
+        logger.info(f"YOLO model {model_path} warmed up")
+
+    def unload(self, model_path: str) -> None:
+        """Drop a model and release the memory it held."""
+        with self._lock:
+            model = self._models.pop(model_path, None)
+            self._last_used.pop(model_path, None)
+        if model is None:
+            return
+        del model
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        logger.info(f"Unloaded YOLO model {model_path}")
+
+    def unload_idle(self) -> None:
+        """Unload every model that has not been used within the idle period."""
+        if self.idle_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            idle = [path for path, used in self._last_used.items() if now - used > self.idle_seconds]
+        for model_path in idle:
+            self.unload(model_path)
+
+    def _start_reaper(self) -> None:
+        """Start the idle-unload thread once a model has been loaded."""
+        if self.idle_seconds <= 0:
+            return
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self) -> None:
+        interval = max(self.idle_seconds / 4, 1.0)
+        while not self._stop.wait(interval):
+            self.unload_idle()
+
+    def shutdown(self) -> None:
+        """Stop the reaper and unload every model."""
+        self._stop.set()
+        with self._lock:
+            model_paths = list(self._models)
+        for model_path in model_paths:
+            self.unload(model_path)
+
+# Initialize the model registry
+model_registry = ModelRegistry()
@@ -0,0 +1,209 @@
+import os
+import ast
+import time
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except ImportError:  # only the torch backend is available
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+# 0 lets ONNX Runtime use one thread per physical core
+ONNX_THREADS = int(os.getenv("DATANIZE_ONNX_THREADS", "0"))
+LETTERBOX_COLOR = 114
+MAX_DETECTIONS = 300
+# Offsets boxes per class so one NMS pass never suppresses across classes
+CLASS_OFFSET = 4096
+
+_export_lock = threading.Lock()
+
+def onnx_path_for(model_path: str, int8: bool = False) -> str:
+    """Return where the ONNX export of a weights file is kept."""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+
+def _is_current(path: str, source_path: str) -> bool:
+    """Whether an exported file exists and is newer than the file it was made from."""
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(source_path) or os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+def export_onnx(model_path: str, int8: bool = False, image_size: int = 640) -> str:
+    """Export YOLO weights to ONNX once, optionally INT8-quantised, and return the ONNX path.
+
+    Later calls reuse the exported file until the weights change. Exporting
+    needs torch and ultralytics; running the exported model only needs
+    onnxruntime.
+    """
+    target = onnx_path_for(model_path, int8)
+    with _export_lock:
+        if _is_current(target, model_path):
+            return target
+
+        fp32_path = onnx_path_for(model_path)
+        if not _is_current(fp32_path, model_path):
+            from ultralytics import YOLO
+
+            logger.info(f"Exporting {model_path} to ONNX...")
+            exported = YOLO(model_path).export(format="onnx", imgsz=image_size, dynamic=True)
+            if os.path.abspath(exported) != os.path.abspath(fp32_path):
+                os.replace(exported, fp32_path)
+
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            logger.info(f"Quantising {fp32_path} to INT8...")
+            temp_path = f"{target}.tmp"
+            quantize_dynamic(fp32_path, temp_path, weight_type=QuantType.QUInt8)
+            os.replace(temp_path, target)
+    return target
+
+def _to_rgb(image: Any) -> np.ndarray:
+    """Accept a path, PIL image or BGR array (the ultralytics convention) and return RGB pixels."""
+    if isinstance(image, (str, Path)):
+        with Image.open(image) as opened:
+            return np.asarray(opened.convert("RGB"))
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert("RGB"))
+    return np.ascontiguousarray(np.asarray(image)[..., ::-1])
+
+def letterbox(pixels: np.ndarray, image_size: int) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """Resize keeping the aspect ratio and pad to a square, as ultralytics does."""
+    height, width = pixels.shape[:2]
+    gain = min(image_size / height, image_size / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    if (new_width, new_height) != (width, height):
+        pixels = np.asarray(Image.fromarray(pixels).resize((new_width, new_height), Image.BILINEAR))
+    pad_x, pad_y = (image_size - new_width) / 2, (image_size - new_height) / 2
+    canvas = np.full((image_size, image_size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+    canvas[top:top + new_height, left:left + new_width] = pixels
+    return canvas, gain, (left, top)
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> List[int]:
+    """Greedy non-maximum suppression over xyxy boxes; returns the kept indices."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size and len(keep) < MAX_DETECTIONS:
+        best = order[0]
+        keep.append(int(best))
+        rest = order[1:]
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        overlap = width * height
+        iou = overlap / (areas[best] + areas[rest] - overlap + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+class OnnxDetector:
+    """YOLO detection through ONNX Runtime on the CPU, returning the same detections as the torch path."""
+
+    def __init__(self, onnx_path: str, threads: int = ONNX_THREADS):
+        if ort is None:
+            raise RuntimeError("The ONNX backend requires onnxruntime")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def detect_batch(self, images: List[Any], conf: float = 0.25, iou: float = 0.7,
+                     image_size: int = 640) -> List[List[Dict[str, Any]]]:
+        """Run one forward pass over a batch and return each image's detections."""
+        frames, transforms = [], []
+        for image in images:
+            pixels = _to_rgb(image)
+            canvas, gain, pad = letterbox(pixels, image_size)
+            frames.append(canvas)
+            transforms.append((gain, pad, pixels.shape[1], pixels.shape[0]))
+
+        batch = np.stack(frames).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(output, transform, conf, iou) for output, transform in zip(outputs, transforms)]
+
+    def _postprocess(self, output: np.ndarray, transform: Tuple[float, Tuple[int, int], int, int],
+                     conf: float, iou: float) -> List[Dict[str, Any]]:
+        """Turn one raw (4 + classes, anchors) output into detections with percentage xyxy boxes."""
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        selected = scores > conf
+        if not selected.any():
+            return []
+        predictions, class_ids, scores = predictions[selected], class_ids[selected], scores[selected]
+
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        keep = nms(boxes + (class_ids * CLASS_OFFSET)[:, None], scores, iou)
+
+        gain, (left, top), width, height = transform
+        boxes = boxes[keep]
+        boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - left) / gain, 0, width) / width
+        boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - top) / gain, 0, height) / height
+        return [
+            {
+                'label': self.names.get(int(class_id), "Unknown"),
+                'confidence': float(score),
+                'bbox': [float(value) * 100 for value in box]
+            }
+            for box, class_id, score in zip(boxes, class_ids[keep], scores[keep])
+        ]
+
+def _benchmark_backend(backend: str, images: List[Any], batch_size: int, repeats: int) -> Dict[str, float]:
+    from services.inference_scheduler import InferenceScheduler
+
+    scheduler = InferenceScheduler(backend=backend)
+    scheduler.warm_up()
+    latencies = []
+    for image in images[:repeats]:
+        started = time.perf_counter()
+        scheduler.predict([image])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        scheduler.predict(images[start:start + batch_size])
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "images_per_second": len(images) / elapsed
+    }
+
+if __name__ == "__main__":
+    # python -m services.onnx_backend --images uploads/images --backends torch onnx onnx-int8
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Compare YOLO inference backends on CPU")
+    parser.add_argument("--images", required=True, help="Folder of images to run detection on")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=50, help="Single-image runs used for latency")
+    args = parser.parse_args()
+
+    from utils.image_labeller import list_images
+
+    # Decode up front so the comparison measures inference rather than disk reads
+    images = [_to_rgb(path) for path in list_images(args.images)]
+    images = [np.ascontiguousarray(pixels[..., ::-1]) for pixels in images]
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    print(f"{'backend':<10} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>8}   ({len(images)} images, batch {args.batch_size})")
+    for backend in args.backends:
+        stats = _benchmark_backend(backend, images, args.batch_size, args.repeats)
+        print(f"{backend:<10} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['images_per_second']:>8.1f}")
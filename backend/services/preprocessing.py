@@ -1,13 +1,25 @@
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder, OneHotEncoder
-from sklearn.model_selection import train_test_split
 import os
 import json
 import logging
-import requests
 import tempfile
-from urllib.parse import urlparse
+
+from services.remote_cache import fetch_remote_file
+from services.data_reader import read_dataset, resolve_local_path
+from services.column_index import get_column_index
+from services.splitting import (
+    write_split_outputs,
+    create_index_split,
+    split_sizes,
+    stream_split_csv,
+    holdout_split_frames,
+    SPLIT_OUTPUT_FORMATS,
+    SPLIT_PARTS
+)
+
+SPLIT_MODES = ["files", "index", "stream"]
 
 logger = logging.getLogger(__name__)
 
@@ -22,59 +34,17 @@ def get_file_path():
     return global_file_path
 
 def download_from_supabase(url: str) -> str:
-    """Download a file from Supabase Storage and return the local path."""
+    """Return a local path for a file in Supabase Storage, downloading it only when it has changed."""
     try:
-        # Get the file extension from the URL
-        file_ext = os.path.splitext(urlparse(url).path)[1]
-        if not file_ext:
-            file_ext = '.csv'  # Default to .csv if no extension found
-            
-        # Create a temporary file with the correct extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            # Download the file
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            # Write the content to the temporary file
-            tmp.write(response.content)
-            return tmp.name
+        return fetch_remote_file(url)
     except Exception as e:
         logger.error(f"Error downloading file from Supabase: {str(e)}")
         raise
 
 def read_data_file(file_path: str) -> pd.DataFrame:
-    """Read a data file and return a pandas DataFrame."""
+    """Read a local or remote data file and return a pandas DataFrame."""
     try:
-        # Check if the file path is a URL
-        parsed_url = urlparse(file_path)
-        if parsed_url.scheme in ['http', 'https']:
-            # Download the file from Supabase
-            local_path = download_from_supabase(file_path)
-            try:
-                # Determine file type and read accordingly
-                if local_path.endswith(('.xlsx', '.xls')):
-                    df = pd.read_excel(local_path)
-                else:
-                    df = pd.read_csv(local_path)
-            except Exception as e:
-                logger.error(f"Error reading downloaded file {local_path}: {str(e)}")
-                raise
-            finally:
-                # Clean up the temporary file
-                try:
-                    os.unlink(local_path)
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temporary file {local_path}: {str(e)}")
-            return df
-        else:
-            # Handle local file
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File not found: {file_path}")
-                
-            if file_path.endswith(('.xlsx', '.xls')):
-                return pd.read_excel(file_path)
-            else:
-                return pd.read_csv(file_path)
+        return read_dataset(file_path)
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {str(e)}")
         raise
@@ -141,15 +111,7 @@ def get_categorical_fields(file_path: str) -> list:
         logger.info(f"Found {len(categorical_fields)} object dtype categorical fields in {file_path}")
         for field in categorical_fields:
             logger.info(f"Field: {field['variable']}, Unique values: {len(field['uniqueValues'])}")
-        
-        # Clean up temporary file if it's not in the uploads directory
-        if file_path.startswith('/tmp') or file_path.startswith(tempfile.gettempdir()):
-            try:
-                os.unlink(file_path)
-                logger.info(f"Cleaned up temporary file: {file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary file {file_path}: {str(e)}")
-        
+
         return categorical_fields
     except Exception as e:
         logger.error(f"Error getting object dtype categorical fields from {file_path}: {str(e)}")
@@ -215,9 +177,64 @@ def encode_categorical_variables(file_path: str, encoding_config: dict) -> dict:
         logger.error(f"Error encoding categorical variables: {str(e)}")
         raise
 
-def split_data(file_path: str, test_size: float = 0.2, random_state: int = 42, target_column: str = None) -> dict:
+def split_data_by_index(file_path: str, test_size: float = 0.2, random_state: int = 42, target_column: str = None,
+                        strategy: str = "random", group_column: str = None, time_column: str = None,
+                        n_splits: int = 5) -> dict:
+    """Split the data by persisting row indices only; outputs are materialised on download."""
+    # Remote datasets are split through their cached copy, which keeps a stable version
+    file_path = resolve_local_path(file_path)
+    # The cached column index provides the row count and columns without re-reading the file
+    index = get_column_index(file_path)
+    if target_column is None or target_column not in index["columns"]:
+        raise ValueError(f"Target column '{target_column}' not found in dataset")
+
+    meta = create_index_split(
+        file_path, index["rows"], test_size, random_state, target_column,
+        strategy=strategy, group_column=group_column, time_column=time_column, n_splits=n_splits
+    )
+    split_id = meta["split_id"]
+    if meta["kind"] == "kfold":
+        downloads = [
+            {part: f"/preprocess/split/{split_id}/{part}?fold={fold}" for part in SPLIT_PARTS}
+            for fold in range(meta["n_splits"])
+        ]
+    else:
+        downloads = {part: f"/preprocess/split/{split_id}/{part}" for part in SPLIT_PARTS}
+    return {
+        "message": "Data split indices created successfully",
+        "mode": "index",
+        "strategy": strategy,
+        "split_id": split_id,
+        "downloads": downloads,
+        "sizes": split_sizes(meta)
+    }
+
+def split_data(file_path: str, test_size: float = 0.2, random_state: int = 42, target_column: str = None,
+               output_format: str = "csv", mode: str = "files", strategy: str = "random",
+               group_column: str = None, time_column: str = None, n_splits: int = 5) -> dict:
     """Split the data into X_train, X_test, y_train, y_test and save them as separate files."""
     try:
+        if mode not in SPLIT_MODES:
+            raise ValueError(f"Invalid split mode. Must be one of: {', '.join(SPLIT_MODES)}")
+        # Checked before any reading, whichever mode writes the outputs
+        if output_format not in SPLIT_OUTPUT_FORMATS:
+            raise ValueError(f"Invalid output format. Must be one of: {', '.join(SPLIT_OUTPUT_FORMATS)}")
+        if mode == "stream":
+            result = stream_split_csv(
+                file_path, os.path.dirname(file_path), test_size, random_state, target_column,
+                strategy=strategy, output_format=output_format
+            )
+            return {
+                "message": "Data split into X_train, X_test, y_train, y_test successfully",
+                "mode": "stream",
+                "format": output_format,
+                **result
+            }
+        if mode == "index":
+            return split_data_by_index(
+                file_path, test_size, random_state, target_column,
+                strategy=strategy, group_column=group_column, time_column=time_column, n_splits=n_splits
+            )
         df = read_data_file(file_path)
         logger.info(f"Original dataset shape: {df.shape}")
 
@@ -229,55 +246,42 @@ def split_data(file_path: str, test_size: float = 0.2, random_state: int = 42, t
         if not pd.api.types.is_numeric_dtype(df[target_column]):
             logger.warning(f"Target column {target_column} is not numeric. Consider encoding it first.")
 
-        X = df.drop(columns=[target_column])
-        y = df[target_column]
-
-        logger.info(f"Features shape: {X.shape}, Target shape: {y.shape}")
-
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=test_size, random_state=random_state
+        X_train, X_test, y_train, y_test = holdout_split_frames(
+            df, target_column, test_size, random_state,
+            strategy=strategy, group_column=group_column, time_column=time_column
         )
 
         logger.info(f"Train set shape: X={X_train.shape}, y={y_train.shape}")
         logger.info(f"Test set shape: X={X_test.shape}, y={y_test.shape}")
 
         base_dir = os.path.dirname(file_path)
-        X_train_path = os.path.join(base_dir, "X_train.csv")
-        X_test_path = os.path.join(base_dir, "X_test.csv")
-        y_train_path = os.path.join(base_dir, "y_train.csv")
-        y_test_path = os.path.join(base_dir, "y_test.csv")
-
-        # Save the files
-        X_train.to_csv(X_train_path, index=False)
-        X_test.to_csv(X_test_path, index=False)
-        y_train.to_frame().to_csv(y_train_path, index=False)
-        y_test.to_frame().to_csv(y_test_path, index=False)
-
-        # Verify files exist
-        for path in [X_train_path, X_test_path, y_train_path, y_test_path]:
-            if not os.path.exists(path):
-                raise ValueError(f"Failed to create file: {path}")
 
-        # Optional: verify shapes match
-        if pd.read_csv(X_train_path).shape != X_train.shape:
-            raise ValueError("Mismatch in X_train dimensions after saving")
-        if pd.read_csv(X_test_path).shape != X_test.shape:
-            raise ValueError("Mismatch in X_test dimensions after saving")
-        if pd.read_csv(y_train_path).shape[0] != y_train.shape[0]:
-            raise ValueError("Mismatch in y_train size after saving")
-        if pd.read_csv(y_test_path).shape[0] != y_test.shape[0]:
-            raise ValueError("Mismatch in y_test size after saving")
+        # Write the four outputs concurrently; row counts and checksums go to a manifest
+        paths, manifest_path = write_split_outputs(
+            {
+                "X_train": X_train,
+                "X_test": X_test,
+                "y_train": y_train.to_frame(),
+                "y_test": y_test.to_frame()
+            },
+            base_dir,
+            output_format=output_format,
+            metadata={
+                "source": file_path,
+                "target_column": target_column,
+                "test_size": test_size,
+                "random_state": random_state,
+                "strategy": strategy
+            }
+        )
 
         logger.info("All files saved and verified successfully.")
 
         return {
             "message": "Data split into X_train, X_test, y_train, y_test successfully",
-            "files": {
-                "X_train": X_train_path,
-                "X_test": X_test_path,
-                "y_train": y_train_path,
-                "y_test": y_test_path
-            },
+            "files": paths,
+            "manifest": manifest_path,
+            "format": output_format,
             "sizes": {
                 "X_train": len(X_train),
                 "X_test": len(X_test),
@@ -0,0 +1,307 @@
+import os
+import glob
+import json
+import shutil
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from utils.http_client import open_stream, STREAM_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+# Kept outside the public /uploads mount so cached third-party data is not served as static files
+REMOTE_CACHE_DIR = os.getenv("DATANIZE_REMOTE_CACHE_DIR", os.path.join(BASE_DIR, "cache", "remote"))
+REMOTE_CACHE_MAX_BYTES = int(os.getenv("DATANIZE_REMOTE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Within this window a cached URL is trusted without asking the server again
+REMOTE_CACHE_FRESH_SECONDS = float(os.getenv("DATANIZE_REMOTE_CACHE_FRESH_SECONDS", "30"))
+# Blobs handed out this recently are not evicted, since a caller may still be reading them
+REMOTE_CACHE_EVICT_GRACE_SECONDS = float(os.getenv("DATANIZE_REMOTE_CACHE_EVICT_GRACE_SECONDS", "300"))
+# Cache hits only move a URL's last-used time, which is written out at most this often
+INDEX_SAVE_INTERVAL_SECONDS = 10
+INDEX_FILE = "index.json"
+
+class RemoteCache:
+    """On-disk cache of remote datasets, stored by content hash and revalidated by URL.
+
+    Each URL maps to a blob named after the SHA-256 of its content, together
+    with the ETag and Last-Modified validators the server sent. Repeat requests
+    revalidate with a conditional GET, so a dataset is downloaded once per
+    version, and identical content fetched from different URLs is stored once.
+    Blobs are evicted least-recently-used first once the cache exceeds its
+    size cap, except those used within ``evict_grace_seconds``.
+    """
+
+    def __init__(self, cache_dir: str = REMOTE_CACHE_DIR, max_bytes: int = REMOTE_CACHE_MAX_BYTES,
+                 fresh_seconds: float = REMOTE_CACHE_FRESH_SECONDS,
+                 evict_grace_seconds: float = REMOTE_CACHE_EVICT_GRACE_SECONDS):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.evict_grace_seconds = evict_grace_seconds
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._saved_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether datasets are kept on disk; a cap of zero turns caching off."""
+        return self.max_bytes > 0
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Load the URL index from disk on first use. Caller holds the lock."""
+        if self._index is None:
+            try:
+                with open(self._index_path(), "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable remote cache index: {str(e)}")
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        """Persist the URL index atomically. Caller holds the lock."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{self._index_path()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self._index_path())
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _blob_path(self, blob: str) -> str:
+        return os.path.join(self.blob_dir, blob)
+
+    def _remove_blob(self, blob: str) -> None:
+        """Delete a blob together with anything derived from it, such as indexes and converted sheets."""
+        path = self._blob_path(blob)
+        for derived in glob.glob(f"{glob.escape(path)}.*"):
+            if os.path.isdir(derived):
+                shutil.rmtree(derived, ignore_errors=True)
+            else:
+                os.remove(derived)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _entry(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the index entry for a URL if its blob is still on disk."""
+        with self._lock:
+            entry = self._load_index().get(url)
+        if entry is not None and os.path.exists(self._blob_path(entry["blob"])):
+            return dict(entry)
+        return None
+
+    def _record(self, url: str, entry: Dict[str, Any]) -> None:
+        """Store an index entry, then evict old blobs if the cache is over its cap."""
+        with self._lock:
+            index = self._load_index()
+            index[url] = entry
+            self._evict(keep=entry["blob"])
+            self._save_index()
+
+    def _touch(self, url: str, now: float) -> None:
+        """Note a cache hit, persisting the index only if it has not been saved for a while."""
+        with self._lock:
+            entry = self._load_index().get(url)
+            if entry is None:
+                return
+            entry["last_used"] = now
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= INDEX_SAVE_INTERVAL_SECONDS:
+                self._save_index()
+
+    def flush(self) -> None:
+        """Write out last-used times that have not been persisted yet."""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _evict(self, keep: str) -> None:
+        """Drop least-recently-used blobs until the cache fits. Caller holds the lock."""
+        index = self._index
+        now = time.time()
+        blobs: Dict[str, Dict[str, Any]] = {}
+        for url, entry in index.items():
+            blob = blobs.setdefault(entry["blob"], {"size": entry["size"], "last_used": 0.0, "urls": []})
+            blob["last_used"] = max(blob["last_used"], entry["last_used"])
+            blob["urls"].append(url)
+
+        total = sum(blob["size"] for blob in blobs.values())
+        for name, blob in sorted(blobs.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            if now - blob["last_used"] < self.evict_grace_seconds:
+                # This and every later blob were handed out too recently to delete safely
+                break
+            try:
+                self._remove_blob(name)
+            except OSError as e:
+                logger.warning(f"Failed to evict remote cache blob {name}, keeping it: {str(e)}")
+                continue
+            for url in blob["urls"]:
+                del index[url]
+            total -= blob["size"]
+            logger.info(f"Evicted remote cache blob {name} ({blob['size']} bytes)")
+
+    def _download(self, url: str, response: requests.Response) -> Dict[str, Any]:
+        """Stream a response body into the blob store, hashing it on the way."""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        file_ext = os.path.splitext(urlparse(url).path)[1] or '.csv'
+        temp_path = os.path.join(self.blob_dir, f".{hashlib.sha256(url.encode('utf-8')).hexdigest()}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            blob = f"{digest.hexdigest()}{file_ext}"
+            if os.path.exists(self._blob_path(blob)):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, self._blob_path(blob))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        now = time.time()
+        logger.info(f"Downloaded {url} into remote cache ({size} bytes)")
+        return {
+            "blob": blob,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "checked_at": now,
+            "last_used": now
+        }
+
+    def fetch(self, url: str) -> str:
+        """Return a local path holding the current content of a remote file."""
+        with self._url_lock(url):
+            entry = self._entry(url)
+            now = time.time()
+            if entry is not None and now - entry["checked_at"] < self.fresh_seconds:
+                self._touch(url, now)
+                return self._blob_path(entry["blob"])
+
+            headers = {}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            try:
+                with open_stream(url, headers=headers) as response:
+                    if response.status_code == 304 and entry is not None:
+                        entry["checked_at"] = entry["last_used"] = now
+                        self._record(url, entry)
+                        return self._blob_path(entry["blob"])
+                    response.raise_for_status()
+                    entry = self._download(url, response)
+            except requests.RequestException as e:
+                if entry is None:
+                    raise
+                # Serve the last known version rather than failing outright
+                logger.warning(f"Revalidation of {url} failed, using cached copy: {str(e)}")
+                return self._blob_path(entry["blob"])
+
+            self._record(url, entry)
+            return self._blob_path(entry["blob"])
+
+    def clear(self) -> None:
+        """Forget every cached URL and delete the stored blobs."""
+        with self._lock:
+            for entry in self._load_index().values():
+                self._remove_blob(entry["blob"])
+            self._index = {}
+            self._save_index()
+
+# Initialize the remote cache
+remote_cache = RemoteCache()
+
+def fetch_remote_file(url: str) -> str:
+    """Return a local copy of a remote file from the shared remote cache."""
+    return remote_cache.fetch(url)
+
+def _self_check() -> None:
+    """Exercise download, revalidation, de-duplication and eviction against a local HTTP stand-in."""
+    import tempfile
+    from functools import partial
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    statuses = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_request(self, code="-", size="-"):
+            statuses.append(int(code))
+
+    with tempfile.TemporaryDirectory() as root:
+        served = os.path.join(root, "served")
+        os.makedirs(served)
+        for name, content in [("a.csv", b"x,y\n1,2\n" * 100), ("a_copy.csv", b"x,y\n1,2\n" * 100),
+                              ("b.csv", b"x,y\n3,4\n" * 100)]:
+            with open(os.path.join(served, name), "wb") as f:
+                f.write(content)
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=served))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            # Room for one blob; nothing is trusted without revalidating
+            cache = RemoteCache(os.path.join(root, "cache"), max_bytes=1200, fresh_seconds=0, evict_grace_seconds=0)
+            first = cache.fetch(f"{base}/a.csv")
+            assert cache.fetch(f"{base}/a.csv") == first and statuses == [200, 304], statuses
+            assert cache.fetch(f"{base}/a_copy.csv") == first, "identical content must share a blob"
+            cache.fetch(f"{base}/b.csv")
+            assert not os.path.exists(first), "the least recently used blob must be evicted"
+
+            # Recently handed-out blobs survive eviction even over the cap
+            cache.evict_grace_seconds = 300
+            again = cache.fetch(f"{base}/a.csv")
+            cache.fetch(f"{base}/b.csv")
+            assert os.path.exists(again), "a blob in its grace period must not be evicted"
+
+            # Fresh hits do not rewrite the index
+            cache.fresh_seconds = 60
+            cache.fetch(f"{base}/b.csv")
+            saved = os.path.getmtime(cache._index_path())
+            requests_made = len(statuses)
+            for _ in range(5):
+                cache.fetch(f"{base}/b.csv")
+            assert len(statuses) == requests_made, "fresh hits must not contact the server"
+            assert os.path.getmtime(cache._index_path()) == saved, "fresh hits must not rewrite the index"
+        finally:
+            server.shutdown()
+            server.server_close()
+    print("remote cache self-check passed")
+
+if __name__ == "__main__":
+    # python -m services.remote_cache
+    logging.basicConfig(level=logging.INFO)
+    _self_check()
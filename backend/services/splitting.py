@@ -0,0 +1,476 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import gzip
+import hashlib
+import logging
+import secrets
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Tuple, List, Iterator, Optional
+from sklearn.model_selection import (
+    train_test_split,
+    ShuffleSplit,
+    StratifiedShuffleSplit,
+    GroupShuffleSplit,
+    KFold,
+    StratifiedKFold,
+    GroupKFold
+)
+
+from services.data_reader import read_dataset, sniff_format
+from utils.file_handler import file_version, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Output format -> file extension
+SPLIT_OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "parquet": ".parquet",
+}
+MANIFEST_NAME = "split_manifest.json"
+
+def split_file_extension(path: str) -> str:
+    """Return the split output extension of a path, including compound ones like .csv.gz."""
+    for extension in sorted(SPLIT_OUTPUT_FORMATS.values(), key=len, reverse=True):
+        if path.endswith(extension):
+            return extension
+    return os.path.splitext(path)[1]
+
+def _write_part(frame: pd.DataFrame, path: str, output_format: str) -> Dict[str, Any]:
+    """Write one split output and describe what was written."""
+    if output_format == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        # Compression is inferred from the .gz extension
+        frame.to_csv(path, index=False)
+
+    size = os.path.getsize(path)
+    if size == 0:
+        raise ValueError(f"Failed to create file: {path}")
+
+    return {
+        "path": path,
+        "rows": int(frame.shape[0]),
+        "columns": int(frame.shape[1]),
+        "bytes": size,
+        "sha256": file_sha256(path)
+    }
+
+def write_split_manifest(base_dir: str, output_format: str, entries: Dict[str, Dict[str, Any]],
+                         metadata: Dict[str, Any] = None) -> str:
+    """Record the written split outputs, their row counts and checksums."""
+    manifest = {
+        "created_at": datetime.now().isoformat(),
+        "format": output_format,
+        **(metadata or {}),
+        "files": entries
+    }
+    manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+def write_split_outputs(parts: Dict[str, pd.DataFrame], base_dir: str, output_format: str = "csv",
+                        metadata: Dict[str, Any] = None) -> Tuple[Dict[str, str], str]:
+    """Write split outputs concurrently and record a checksum manifest.
+
+    Row and column counts are taken from the frames as they are written, so
+    no output has to be read back to be verified.
+    """
+    if output_format not in SPLIT_OUTPUT_FORMATS:
+        raise ValueError(f"Invalid output format. Must be one of: {', '.join(SPLIT_OUTPUT_FORMATS)}")
+
+    extension = SPLIT_OUTPUT_FORMATS[output_format]
+    paths = {name: os.path.join(base_dir, f"{name}{extension}") for name in parts}
+
+    with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+        futures = {
+            name: executor.submit(_write_part, frame, paths[name], output_format)
+            for name, frame in parts.items()
+        }
+        entries = {name: future.result() for name, future in futures.items()}
+
+    manifest_path = write_split_manifest(base_dir, output_format, entries, metadata)
+    logger.info(f"Wrote {len(parts)} split outputs as {output_format} with manifest {manifest_path}")
+    return paths, manifest_path
+
+class SplitSourceChanged(Exception):
+    """Raised when the source of an index split has changed or gone since the split was made."""
+
+SPLIT_PARTS = ["X_train", "X_test", "y_train", "y_test"]
+SPLITS_DIR = os.path.join(Path(__file__).resolve().parent.parent, "uploads", "splits")
+MATERIALIZE_CHUNK_ROWS = 50000
+
+def _split_id(file_path: str, version: str, params: Dict[str, Any]) -> str:
+    """Derive a deterministic split id from the source version and split parameters."""
+    key = json.dumps([os.path.abspath(file_path), version, params], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def _index_dtype(n_rows: int):
+    """Use the narrowest integer type that can address every row."""
+    return np.int32 if n_rows < np.iinfo(np.int32).max else np.int64
+
+HOLDOUT_STRATEGIES = ["random", "stratified", "group", "time"]
+KFOLD_STRATEGIES = ["kfold", "stratified_kfold", "group_kfold"]
+SPLIT_STRATEGIES = HOLDOUT_STRATEGIES + KFOLD_STRATEGIES
+
+def validate_split_strategy(strategy: str, group_column: Optional[str] = None,
+                            time_column: Optional[str] = None, n_splits: int = 5) -> None:
+    """Check that a split strategy has the columns and fold count it needs."""
+    if strategy not in SPLIT_STRATEGIES:
+        raise ValueError(f"Invalid split strategy. Must be one of: {', '.join(SPLIT_STRATEGIES)}")
+    if strategy in ["group", "group_kfold"] and not group_column:
+        raise ValueError(f"The {strategy} strategy requires a group_column")
+    if strategy == "time" and not time_column:
+        raise ValueError("The time strategy requires a time_column")
+    if strategy in KFOLD_STRATEGIES and n_splits < 2:
+        raise ValueError("K-fold strategies require n_splits of at least 2")
+
+def strategy_columns(strategy: str, target_column: str, group_column: Optional[str] = None,
+                     time_column: Optional[str] = None) -> List[str]:
+    """Return the columns a split strategy has to read."""
+    columns = [target_column]
+    if strategy in ["group", "group_kfold"]:
+        columns.append(group_column)
+    if strategy == "time":
+        columns.append(time_column)
+    return list(dict.fromkeys(columns))
+
+def _read_columns(file_path: str, columns: List[str]) -> pd.DataFrame:
+    """Read only the given columns of a dataset."""
+    return read_dataset(file_path, usecols=columns)[columns]
+
+def compute_split_assignment(columns: pd.DataFrame, test_size: float, random_state: Optional[int],
+                             strategy: str, target_column: str, group_column: Optional[str] = None,
+                             time_column: Optional[str] = None, n_splits: int = 5) -> Tuple[str, np.ndarray, int]:
+    """Assign rows to a holdout split or to folds from the target, group and time columns only.
+
+    Holdout strategies return ("holdout", test ids followed by train ids, n_test).
+    K-fold strategies return ("kfold", fold id per row, 0).
+    """
+    validate_split_strategy(strategy, group_column, time_column, n_splits)
+    n_rows = len(columns)
+    placeholder = np.zeros((n_rows, 1), dtype=np.int8)
+    labels = columns[target_column].astype(str).to_numpy() if target_column in columns else None
+    groups = columns[group_column].astype(str).to_numpy() if group_column in columns else None
+
+    if strategy in KFOLD_STRATEGIES:
+        if strategy == "stratified_kfold":
+            folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(placeholder, labels)
+        elif strategy == "group_kfold":
+            folds = GroupKFold(n_splits=n_splits).split(placeholder, groups=groups)
+        else:
+            folds = KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(placeholder)
+        fold_ids = np.empty(n_rows, dtype=np.int16)
+        for fold, (_, test_idx) in enumerate(folds):
+            fold_ids[test_idx] = fold
+        return "kfold", fold_ids, 0
+
+    if strategy == "time":
+        times = columns[time_column]
+        if not pd.api.types.is_numeric_dtype(times):
+            times = pd.to_datetime(times, errors="coerce")
+        missing = int(times.isna().sum())
+        if missing:
+            # They would sort last and land in the test set without anyone noticing
+            raise ValueError(f"Time column '{time_column}' has {missing} missing or unparseable values")
+        order = np.argsort(times.to_numpy(), kind="stable")
+        n_test = int(np.ceil(test_size * n_rows))
+        train_idx, test_idx = order[:n_rows - n_test], order[n_rows - n_test:]
+    else:
+        if strategy == "stratified":
+            splitter = StratifiedShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+            train_idx, test_idx = next(splitter.split(placeholder, labels))
+        elif strategy == "group":
+            splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+            train_idx, test_idx = next(splitter.split(placeholder, groups=groups))
+        else:
+            splitter = ShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+            train_idx, test_idx = next(splitter.split(placeholder))
+    return "holdout", np.concatenate([test_idx, train_idx]), int(len(test_idx))
+
+def holdout_split_frames(df: pd.DataFrame, target_column: str, test_size: float, random_state: Optional[int],
+                         strategy: str = "random", group_column: Optional[str] = None,
+                         time_column: Optional[str] = None):
+    """Split a loaded DataFrame into X_train, X_test, y_train, y_test with a holdout strategy."""
+    validate_split_strategy(strategy, group_column, time_column)
+    if strategy not in HOLDOUT_STRATEGIES:
+        raise ValueError(f"The {strategy} strategy is only available in index mode")
+
+    X = df.drop(columns=[target_column])
+    y = df[target_column]
+    if strategy == "random":
+        return train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    split_columns = strategy_columns(strategy, target_column, group_column, time_column)
+    missing = [c for c in split_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {', '.join(missing)} not found in dataset")
+    _, order, n_test = compute_split_assignment(
+        df[split_columns], test_size, random_state, strategy, target_column, group_column, time_column
+    )
+    test_idx, train_idx = order[:n_test], order[n_test:]
+    return X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
+
+def create_index_split(file_path: str, n_rows: int, test_size: float, random_state: Optional[int],
+                       target_column: str, strategy: str = "random", group_column: Optional[str] = None,
+                       time_column: Optional[str] = None, n_splits: int = 5) -> Dict[str, Any]:
+    """Persist a split as one compact index array instead of copies of the data.
+
+    Holdout splits store the test row ids followed by the train row ids, in
+    the same order ``train_test_split`` would return them for the random
+    strategy. K-fold splits store a fold id per row, so all K folds cost a
+    single small array.
+    """
+    validate_split_strategy(strategy, group_column, time_column, n_splits)
+    params = {"test_size": test_size, "random_state": random_state, "target_column": target_column,
+              "strategy": strategy}
+    if strategy in ["group", "group_kfold"]:
+        params["group_column"] = group_column
+    if strategy == "time":
+        params["time_column"] = time_column
+    if strategy in KFOLD_STRATEGIES:
+        params["n_splits"] = n_splits
+    if random_state is None and strategy not in ["time", "group_kfold"]:
+        # An unseeded split is meant to differ every time, so it must not be reused
+        params["nonce"] = uuid.uuid4().hex
+
+    version = file_version(file_path)
+    split_id = _split_id(file_path, version, params)
+    os.makedirs(SPLITS_DIR, exist_ok=True)
+
+    meta_path = os.path.join(SPLITS_DIR, f"{split_id}.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            logger.info(f"Reusing existing index split {split_id}")
+            return json.load(f)
+
+    if strategy == "random":
+        # Only the row count is needed
+        columns = pd.DataFrame(index=pd.RangeIndex(n_rows))
+    else:
+        # Read the target, group and time columns together in one pass
+        columns = _read_columns(file_path, strategy_columns(strategy, target_column, group_column, time_column))
+
+    kind, array, n_test = compute_split_assignment(
+        columns, test_size, random_state, strategy, target_column, group_column, time_column, n_splits
+    )
+    if kind == "holdout":
+        array = array.astype(_index_dtype(n_rows))
+    np.save(os.path.join(SPLITS_DIR, f"{split_id}.npy"), array)
+
+    meta = {
+        "split_id": split_id,
+        "kind": kind,
+        "source": os.path.abspath(file_path),
+        "dataset_version": version,
+        "n_rows": n_rows,
+        "n_test": n_test,
+        **params,
+        "created_at": datetime.now().isoformat()
+    }
+    if kind == "kfold":
+        meta["fold_sizes"] = np.bincount(array, minlength=n_splits).tolist()
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(f"Created {strategy} index split {split_id} over {n_rows} rows")
+    return meta
+
+def load_index_split(split_id: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Load a persisted split's metadata and index array."""
+    if not split_id.isalnum():
+        raise ValueError("Invalid split id")
+    meta_path = os.path.join(SPLITS_DIR, f"{split_id}.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"Split not found: {split_id}")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    array = np.load(os.path.join(SPLITS_DIR, f"{split_id}.npy"), mmap_mode="r")
+    return meta, array
+
+def split_sizes(meta: Dict[str, Any]) -> Any:
+    """Return the row count of each split part, per fold for k-fold splits."""
+    if meta.get("kind") == "kfold":
+        n_rows = meta["n_rows"]
+        return [
+            {"X_train": n_rows - size, "X_test": size, "y_train": n_rows - size, "y_test": size}
+            for size in meta["fold_sizes"]
+        ]
+    n_train = meta["n_rows"] - meta["n_test"]
+    return {"X_train": n_train, "X_test": meta["n_test"], "y_train": n_train, "y_test": meta["n_test"]}
+
+def part_row_ids(meta: Dict[str, Any], array: np.ndarray, part: str, fold: Optional[int] = None) -> np.ndarray:
+    """Return the row ids that make up one split part."""
+    if part not in SPLIT_PARTS:
+        raise ValueError(f"Invalid split part. Must be one of: {', '.join(SPLIT_PARTS)}")
+    if meta.get("kind") == "kfold":
+        if fold is None or not 0 <= fold < meta["n_splits"]:
+            raise ValueError(f"A fold between 0 and {meta['n_splits'] - 1} is required for k-fold splits")
+        in_fold = np.asarray(array) == fold
+        return np.flatnonzero(in_fold if part.endswith("_test") else ~in_fold)
+    if part.endswith("_test"):
+        return array[:meta["n_test"]]
+    return array[meta["n_test"]:]
+
+def open_split_part(split_id: str, part: str, fold: Optional[int] = None) -> Tuple[pd.DataFrame, List[str], np.ndarray]:
+    """Load the source of an index split and resolve the rows and columns of one part."""
+    meta, array = load_index_split(split_id)
+    row_ids = part_row_ids(meta, array, part, fold)
+
+    if not os.path.exists(meta["source"]) or file_version(meta["source"]) != meta["dataset_version"]:
+        raise SplitSourceChanged("The source file has changed since this split was created. Please split it again.")
+
+    df = read_dataset(meta["source"])
+    target = meta["target_column"]
+    if part.startswith("X_"):
+        columns = [c for c in df.columns if c != target]
+    else:
+        columns = [target]
+    return df, columns, row_ids
+
+def iter_rows_csv(df: pd.DataFrame, columns: List[str], row_ids: np.ndarray,
+                  chunk_rows: int = MATERIALIZE_CHUNK_ROWS) -> Iterator[bytes]:
+    """Stream selected rows and columns of a DataFrame as CSV, one chunk at a time."""
+    for start in range(0, max(len(row_ids), 1), chunk_rows):
+        chunk = df.iloc[np.asarray(row_ids[start:start + chunk_rows])][columns]
+        yield chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+
+STREAM_CHUNK_ROWS = 100000
+STREAM_OUTPUT_FORMATS = ["csv", "csv.gz"]
+
+def _row_uniforms(row_ids: np.ndarray, seed: int) -> np.ndarray:
+    """Map row ids to deterministic uniform values in [0, 1) with a splitmix64 hash."""
+    with np.errstate(over="ignore"):
+        z = row_ids.astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def _target_histogram(file_path: str, target_column: str, chunk_rows: int,
+                      compression: Optional[str] = None) -> Dict[str, int]:
+    """Count target values in a first pass that reads only the target column."""
+    counts: Dict[str, int] = {}
+    reader = pd.read_csv(file_path, usecols=[target_column], dtype=str, keep_default_na=False,
+                         chunksize=chunk_rows, compression=compression)
+    for chunk in reader:
+        for value, count in chunk[target_column].value_counts().items():
+            counts[value] = counts.get(value, 0) + int(count)
+    return counts
+
+def _open_stream_output(path: str, output_format: str):
+    """Open a split output for incremental text writes."""
+    if output_format == "csv.gz":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def stream_split_csv(file_path: str, output_dir: str, test_size: float, random_state: Optional[int],
+                     target_column: str, strategy: str = "random", output_format: str = "csv",
+                     chunk_rows: int = STREAM_CHUNK_ROWS) -> Dict[str, Any]:
+    """Split a CSV of any size into the four outputs with constant memory.
+
+    Rows are read in chunks and written straight to the outputs. With the
+    random strategy each row is assigned by a seeded hash of its row number,
+    so the split does not depend on the chunk size. The stratified strategy
+    first counts the target values, then draws exactly round(test_size * n)
+    test rows per class while streaming. Without ``random_state`` a fresh
+    seed is drawn; the seed used is returned so the split can be reproduced.
+    """
+    input_format = sniff_format(file_path)
+    if input_format not in ["csv", "csv.gz"]:
+        raise ValueError("Streaming split supports CSV files only")
+    compression = "gzip" if input_format == "csv.gz" else None
+    if output_format not in STREAM_OUTPUT_FORMATS:
+        raise ValueError(f"Invalid output format for streaming split. Must be one of: {', '.join(STREAM_OUTPUT_FORMATS)}")
+    if strategy not in ["random", "stratified"]:
+        raise ValueError("Streaming split supports the random and stratified strategies only")
+    if not 0 < test_size < 1:
+        raise ValueError("Test size must be between 0 and 1")
+
+    seed = random_state if random_state is not None else secrets.randbits(32)
+    header = pd.read_csv(file_path, nrows=0, compression=compression).columns.tolist()
+    if target_column not in header:
+        raise ValueError(f"Target column '{target_column}' not found in dataset")
+    feature_columns = [c for c in header if c != target_column]
+
+    # Remaining rows and remaining test rows per class, for exact stratification
+    remaining: Dict[str, int] = {}
+    needed: Dict[str, int] = {}
+    rng = np.random.default_rng(seed)
+    if strategy == "stratified":
+        remaining = _target_histogram(file_path, target_column, chunk_rows, compression)
+        needed = {value: int(round(test_size * count)) for value, count in remaining.items()}
+        logger.info(f"Stratifying streaming split over {len(remaining)} target classes")
+
+    extension = SPLIT_OUTPUT_FORMATS[output_format]
+    paths = {name: os.path.join(output_dir, f"{name}{extension}") for name in SPLIT_PARTS}
+    rows = {name: 0 for name in SPLIT_PARTS}
+    handles = {name: _open_stream_output(path, output_format) for name, path in paths.items()}
+    try:
+        # Headers first, so every output has one even when the source has no rows
+        for name, handle in handles.items():
+            columns = feature_columns if name.startswith("X_") else [target_column]
+            pd.DataFrame(columns=columns).to_csv(handle, index=False)
+
+        # Read values as text so they are written back exactly as they appear in the source
+        reader = pd.read_csv(file_path, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+                             compression=compression)
+        offset = 0
+        for chunk in reader:
+            if strategy == "stratified":
+                is_test = np.zeros(len(chunk), dtype=bool)
+                for value, positions in chunk.groupby(target_column, sort=False).indices.items():
+                    m = len(positions)
+                    need, left = needed[value], remaining[value]
+                    if need == 0:
+                        take = 0
+                    elif m >= left:
+                        take = need
+                    else:
+                        take = int(rng.hypergeometric(need, left - need, m))
+                    if take:
+                        is_test[positions[rng.choice(m, size=take, replace=False)]] = True
+                    needed[value] = need - take
+                    remaining[value] = left - m
+            else:
+                row_ids = np.arange(offset, offset + len(chunk))
+                is_test = _row_uniforms(row_ids, seed) < test_size
+
+            for name, mask in [("train", ~is_test), ("test", is_test)]:
+                part = chunk[mask]
+                part[feature_columns].to_csv(handles[f"X_{name}"], index=False, header=False)
+                part[[target_column]].to_csv(handles[f"y_{name}"], index=False, header=False)
+                rows[f"X_{name}"] += len(part)
+                rows[f"y_{name}"] += len(part)
+            offset += len(chunk)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    entries = {
+        name: {
+            "path": paths[name],
+            "rows": rows[name],
+            "columns": len(feature_columns) if name.startswith("X_") else 1,
+            "bytes": os.path.getsize(paths[name]),
+            "sha256": file_sha256(paths[name])
+        }
+        for name in SPLIT_PARTS
+    }
+    manifest_path = write_split_manifest(output_dir, output_format, entries, {
+        "source": file_path,
+        "target_column": target_column,
+        "test_size": test_size,
+        "random_state": seed,
+        "strategy": strategy,
+        "mode": "stream"
+    })
+
+    logger.info(f"Streamed split of {offset} rows: train={rows['X_train']}, test={rows['X_test']}")
+    return {"files": paths, "manifest": manifest_path, "sizes": rows, "random_state": seed}
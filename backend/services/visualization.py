@@ -1,13 +1,16 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 from pptx import Presentation
 from pptx.util import Inches
-import seaborn as sns
+import io
 import os
-from typing import Dict, Any, List, Tuple
+import uuid
+from typing import Dict, Any, List, Tuple, Union, Optional
 import logging
 import numpy as np
-import matplotlib.cm as cm
+from PIL import Image
+
+from services.chart_renderer import render_chart_png
+from services.data_reader import read_dataset, read_header
 
 logger = logging.getLogger(__name__)
 
@@ -64,48 +67,92 @@ def validate_and_prepare_data(df: pd.DataFrame, x_col: str, y_col: str, chart_ty
 
     return df, x_col, y_col
 
-def generate_chart_data(file_path: str, x_col: str, y_col: str, chart_type: str) -> List[Dict[str, Any]]:
-    """Generate chart data from the input file and selected columns."""
+def read_chart_source(file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read the input file a chart is drawn from, parsing only the given columns if any."""
     try:
-        # Read the file based on extension
-        try:
-            if file_path.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(file_path)
-            else:
-                df = pd.read_csv(file_path)
-        except Exception as e:
-            raise ValueError(f"Failed to read file: {str(e)}")
-
-        # Validate and prepare data
-        df, x_col, y_col = validate_and_prepare_data(df, x_col, y_col, chart_type)
-
-        # Generate chart data based on chart type
-        if chart_type == "pie":
-            chart_data = (
-                df.groupby(x_col)[y_col]
-                .agg('sum')
-                .reset_index()
-                .to_dict('records')
-            )
-        else:
-            # For other charts, sort by x_col and handle numeric x-axis
-            if pd.api.types.is_numeric_dtype(df[x_col]):
-                df = df.sort_values(by=x_col)
-            chart_data = df[[x_col, y_col]].to_dict('records')
-
-        # Validate final data
-        if not chart_data:
-            raise ValueError("No valid data points generated for the chart")
-
-        logger.info(f"Successfully generated {chart_type} chart data with {len(chart_data)} points")
-        return chart_data
-
+        if columns:
+            # Missing columns are left for chart validation to report
+            header = read_header(file_path)
+            columns = [c for c in dict.fromkeys(columns) if c in header] or None
+        return read_dataset(file_path, usecols=columns)
     except Exception as e:
-        logger.error(f"Error generating chart data: {str(e)}")
-        raise ValueError(f"Failed to generate chart data: {str(e)}")
-
-def export_to_ppt(chart_data: List[Dict[str, Any]], chart_type: str, x_column: str, y_column: str) -> str:
-    """Create a PowerPoint presentation with the chart."""
+        raise ValueError(f"Failed to read file: {str(e)}")
+
+def build_chart_frame(df: pd.DataFrame, x_col: str, y_col: str, chart_type: str) -> pd.DataFrame:
+    """Reduce an already loaded DataFrame to the two chart columns, leaving it untouched."""
+    # Work on a projection so one loaded dataset can feed several charts
+    if x_col in df.columns and y_col in df.columns:
+        df = df[list(dict.fromkeys([x_col, y_col]))].copy()
+
+    # Validate and prepare data
+    df, x_col, y_col = validate_and_prepare_data(df, x_col, y_col, chart_type)
+
+    # Generate chart data based on chart type
+    if chart_type == "pie":
+        frame = df.groupby(x_col)[y_col].agg('sum').reset_index()
+    else:
+        # For other charts, sort by x_col and handle numeric x-axis
+        if pd.api.types.is_numeric_dtype(df[x_col]):
+            df = df.sort_values(by=x_col)
+        frame = df[[x_col, y_col]]
+
+    # Validate final data
+    if frame.empty:
+        raise ValueError("No valid data points generated for the chart")
+
+    return frame
+
+def prepare_chart_frame(file_path: str, x_col: str, y_col: str, chart_type: str) -> pd.DataFrame:
+    """Read the input file and reduce it to the two chart columns, ready for serialisation."""
+    return build_chart_frame(read_chart_source(file_path, [x_col, y_col]), x_col, y_col, chart_type)
+
+def to_columnar(frame: pd.DataFrame, x_col: str, y_col: str) -> Dict[str, List[Any]]:
+    """Convert a prepared chart frame to the compact {x: [...], y: [...]} layout."""
+    return {
+        "x": frame[x_col].tolist(),
+        "y": frame[y_col].tolist()
+    }
+
+def check_chart_data(chart_data: Any, x_column: str, y_column: str) -> int:
+    """Validate records or columnar chart data and return its number of points."""
+    if isinstance(chart_data, dict):
+        if not isinstance(chart_data.get("x"), list) or not isinstance(chart_data.get("y"), list):
+            raise ValueError("Columnar chart data must contain 'x' and 'y' lists")
+        if len(chart_data["x"]) != len(chart_data["y"]):
+            raise ValueError("Columnar chart data 'x' and 'y' must have the same length")
+        return len(chart_data["x"])
+    for item in chart_data:
+        if x_column not in item or y_column not in item:
+            raise ValueError(f"Every chart data point must contain '{x_column}' and '{y_column}'")
+    return len(chart_data)
+
+def chart_series(chart_data: Any, x_column: str, y_column: str) -> Tuple[List[Any], List[Any]]:
+    """Return x and y series from either records or columnar chart data."""
+    if isinstance(chart_data, dict):
+        return list(chart_data["x"]), list(chart_data["y"])
+    return [item[x_column] for item in chart_data], [item[y_column] for item in chart_data]
+
+def add_chart_slides(prs: Presentation, chart_image: bytes, chart_type: str, x_column: str, y_column: str) -> None:
+    """Add a title slide and a chart slide holding a rendered PNG to a presentation."""
+    # Add a title slide
+    title_slide_layout = prs.slide_layouts[0]
+    slide = prs.slides.add_slide(title_slide_layout)
+    title = slide.shapes.title
+    subtitle = slide.placeholders[1]
+    title.text = f"{y_column} vs {x_column}"
+    subtitle.text = f"Chart Type: {chart_type.capitalize()}"
+
+    # Create a new slide for the chart
+    slide = prs.slides.add_slide(prs.slide_layouts[5])
+    left = Inches(1)
+    top = Inches(1)
+    width = Inches(8)
+    height = Inches(5)
+    slide.shapes.add_picture(io.BytesIO(chart_image), left, top, width, height)
+
+def export_to_ppt(chart_data: Union[List[Dict[str, Any]], Dict[str, List[Any]]], chart_type: str, x_column: str, y_column: str,
+                  chart_image: Optional[bytes] = None) -> str:
+    """Create a PowerPoint presentation with the chart and return its unique path."""
     try:
         # Get the absolute path to the uploads directory
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -113,106 +160,52 @@ def export_to_ppt(chart_data: List[Dict[str, Any]], chart_type: str, x_column: s
         
         # Ensure uploads directory exists
         os.makedirs(uploads_dir, exist_ok=True)
-        
+
+        # Render the chart in memory unless the caller already rendered it
+        if chart_image is None:
+            try:
+                x_data, y_data = chart_series(chart_data, x_column, y_column)
+                chart_image = render_chart_png(x_data, y_data, chart_type, x_column, y_column)
+            except Exception as e:
+                raise ValueError(f"Failed to create chart: {str(e)}")
+
         # Create a new presentation
         prs = Presentation()
-        
-        # Add a title slide
-        title_slide_layout = prs.slide_layouts[0]
-        slide = prs.slides.add_slide(title_slide_layout)
-        title = slide.shapes.title
-        subtitle = slide.placeholders[1]
-        title.text = f"{y_column} vs {x_column}"
-        subtitle.text = f"Chart Type: {chart_type.capitalize()}"
-        
-        # Create a new slide for the chart
-        slide = prs.slides.add_slide(prs.slide_layouts[5])
-        
-        # Set up the plot with error handling
-        plt.figure(figsize=(10, 6))
-        try:
-            # Convert data to x and y series
-            x_data = [item[x_column] for item in chart_data]
-            y_data = [item[y_column] for item in chart_data]
-            
-            # Set dark blue color
-            dark_blue = '#1e40af'  # Tailwind dark blue-700
-            
-            if chart_type == "bar":
-                plt.bar(x_data, y_data, color=dark_blue)
-            elif chart_type == "line":
-                plt.plot(x_data, y_data, color=dark_blue, linewidth=2)
-            elif chart_type == "scatter":
-                plt.scatter(x_data, y_data, color=dark_blue)
-            elif chart_type == "pie":
-                # Use a color palette for the pie slices
-                colors = cm.get_cmap('tab20').colors
-                num_slices = len(x_data)
-                slice_colors = colors[:num_slices]
-                plt.pie(y_data, labels=x_data, autopct='%1.1f%%', colors=slice_colors)
-            
-            plt.xlabel(x_column)
-            plt.ylabel(y_column)
-            plt.title(f"{y_column} vs {x_column}")
-            
-            # Handle long labels
-            if chart_type != "pie":
-                plt.xticks(rotation=45, ha='right')
-            
-            # Adjust layout to prevent label cutoff
-            plt.tight_layout()
-            
-        except Exception as e:
-            plt.close()
-            raise ValueError(f"Failed to create chart: {str(e)}")
-        
-        # Save the chart as a temporary image
-        temp_image = os.path.join(uploads_dir, "temp_chart.png")
         try:
-            plt.savefig(temp_image, bbox_inches='tight', dpi=300)
+            add_chart_slides(prs, chart_image, chart_type, x_column, y_column)
         except Exception as e:
-            plt.close()
-            raise ValueError(f"Failed to save chart image: {str(e)}")
-        finally:
-            plt.close()
-        
-        # Add the chart to the slide
-        try:
-            left = Inches(1)
-            top = Inches(1)
-            width = Inches(8)
-            height = Inches(5)
-            slide.shapes.add_picture(temp_image, left, top, width, height)
-        except Exception as e:
-            if os.path.exists(temp_image):
-                os.remove(temp_image)
             raise ValueError(f"Failed to add chart to slide: {str(e)}")
-        
-        # Save the presentation
-        output_path = os.path.join(uploads_dir, "chart_presentation.pptx")
+
+        # Save the presentation under a unique name so concurrent exports don't collide
+        output_path = os.path.join(uploads_dir, f"chart_presentation_{uuid.uuid4().hex}.pptx")
         try:
             prs.save(output_path)
         except Exception as e:
-            if os.path.exists(temp_image):
-                os.remove(temp_image)
             raise ValueError(f"Failed to save PowerPoint file: {str(e)}")
-        
-        # Clean up the temporary image
-        if os.path.exists(temp_image):
-            try:
-                os.remove(temp_image)
-            except Exception as e:
-                logger.warning(f"Failed to remove temporary image: {str(e)}")
-        
+
         return output_path
         
     except Exception as e:
-        # Clean up temporary files in case of error
-        temp_image = os.path.join(uploads_dir, "temp_chart.png")
-        if os.path.exists(temp_image):
-            try:
-                os.remove(temp_image)
-            except:
-                pass
         logger.error(f"Error in PPT export: {str(e)}")
-        raise ValueError(f"Failed to export to PPT: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Failed to export to PPT: {str(e)}")
+
+def build_report_pptx(charts: List[Dict[str, Any]], title: str, subtitle: str) -> bytes:
+    """Assemble rendered charts into a single PowerPoint report."""
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[0])
+    slide.shapes.title.text = title
+    slide.placeholders[1].text = subtitle
+
+    for chart in charts:
+        add_chart_slides(prs, chart["image"], chart["chart_type"], chart["x_col"], chart["y_col"])
+
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+def build_report_pdf(charts: List[Dict[str, Any]], dpi: int) -> bytes:
+    """Assemble rendered charts into a multi-page PDF report, one chart per page."""
+    pages = [Image.open(io.BytesIO(chart["image"])).convert("RGB") for chart in charts]
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:], resolution=dpi)
+    return buffer.getvalue()
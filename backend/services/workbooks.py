@@ -0,0 +1,184 @@
+import os
+import json
+import uuid
+import shutil
+import datetime
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.file_handler import file_version
+
+import pyarrow as pa
+import python_calamine
+
+logger = logging.getLogger(__name__)
+
+SHEETS_SUFFIX = ".sheets"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+_conversion_locks: Dict[str, threading.Lock] = {}
+_conversion_locks_guard = threading.Lock()
+
+def excel_engine() -> Optional[str]:
+    """Return "calamine" when pandas can use it directly, else None to read through python-calamine."""
+    pandas_version = tuple(int(part) for part in pd.__version__.split(".")[:2])
+    if pandas_version >= (2, 2):
+        return "calamine"
+    return None
+
+def list_sheets(file_path: str) -> List[str]:
+    """Return a workbook's sheet names without parsing any cells."""
+    return list(python_calamine.CalamineWorkbook.from_path(file_path).sheet_names)
+
+def _dedupe_columns(header: List[Any]) -> List[Any]:
+    """Name blank header cells and suffix duplicates the way pandas does."""
+    columns, seen = [], {}
+    for position, name in enumerate(header):
+        if name is None or name == "":
+            name = f"Unnamed: {position}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+def _calamine_frame(rows: List[List[Any]]) -> pd.DataFrame:
+    """Build a DataFrame from calamine rows with the dtypes read_excel would give."""
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows[1:], columns=_dedupe_columns(rows[0]))
+    df = df.replace("", np.nan)
+
+    for column in df.columns:
+        series = df[column]
+        if series.dtype != object:
+            continue
+        values = series.dropna()
+        if not len(values):
+            df[column] = np.nan
+        elif values.map(lambda v: isinstance(v, (datetime.date, datetime.datetime))).all():
+            df[column] = pd.to_datetime(series)
+        elif values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)).all():
+            df[column] = pd.to_numeric(series)
+        else:
+            # Mixed columns keep whole numbers as ints, as openpyxl reports them
+            df[column] = series.map(lambda v: int(v) if isinstance(v, float) and v.is_integer() else v)
+
+    # Excel stores every number as a float; whole-number columns come back as ints
+    for column in df.select_dtypes(include="float").columns:
+        series = df[column]
+        if series.notna().all() and len(series) and (series % 1 == 0).all():
+            df[column] = series.astype("int64")
+    return df
+
+def read_excel_sheet(file_path: str, sheet_name: Union[int, str] = 0, nrows: Optional[int] = None,
+                     dtype: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """Parse one sheet of a workbook with the calamine engine."""
+    if excel_engine() is None:
+        workbook = python_calamine.CalamineWorkbook.from_path(file_path)
+        sheet = workbook.get_sheet_by_index(sheet_name) if isinstance(sheet_name, int) \
+            else workbook.get_sheet_by_name(sheet_name)
+        rows = sheet.to_python(nrows=nrows + 1) if nrows is not None else sheet.to_python()
+        df = _calamine_frame(rows)
+        return df.astype(dtype) if dtype else df
+    return pd.read_excel(file_path, sheet_name=sheet_name, nrows=nrows, dtype=dtype, engine="calamine")
+
+def _columnar_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Make a sheet storable as Parquet: string column names, one type per column."""
+    df = df.copy()
+    df.columns = [str(column) for column in df.columns]
+    for column in df.select_dtypes(include="object").columns:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed cell types in one column are kept as text
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+def _sheets_dir(file_path: str) -> str:
+    return f"{file_path}{SHEETS_SUFFIX}"
+
+def load_sheet_manifest(file_path: str) -> Optional[Dict[str, Any]]:
+    """Return the converted-sheet manifest for a workbook if it matches the current file."""
+    manifest_path = os.path.join(_sheets_dir(file_path), MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        return None
+    if manifest.get("dataset_version") != file_version(file_path):
+        return None
+    return manifest
+
+def _conversion_lock(file_path: str) -> threading.Lock:
+    with _conversion_locks_guard:
+        return _conversion_locks.setdefault(os.path.abspath(file_path), threading.Lock())
+
+def convert_workbook(file_path: str) -> Dict[str, Any]:
+    """Convert every sheet of a workbook to a Parquet file once, and return the manifest.
+
+    Later reads load the Parquet files instead of parsing the workbook again.
+    """
+    with _conversion_lock(file_path):
+        manifest = load_sheet_manifest(file_path)
+        if manifest is not None:
+            return manifest
+
+        version = file_version(file_path)
+        target_dir = _sheets_dir(file_path)
+        temp_dir = f"{target_dir}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(temp_dir)
+        try:
+            sheets = []
+            for index, name in enumerate(list_sheets(file_path)):
+                df = _columnar_frame(read_excel_sheet(file_path, index))
+                file_name = f"{index}.parquet"
+                df.to_parquet(os.path.join(temp_dir, file_name), index=False)
+                sheets.append({
+                    "index": index,
+                    "name": name,
+                    "file": file_name,
+                    "rows": int(len(df)),
+                    "columns": df.columns.tolist()
+                })
+            manifest = {
+                "format_version": MANIFEST_FORMAT_VERSION,
+                "dataset_version": version,
+                "sheets": sheets
+            }
+            with open(os.path.join(temp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+            if os.path.exists(target_dir):
+                shutil.rmtree(target_dir)
+            os.replace(temp_dir, target_dir)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+    logger.info(f"Converted {len(sheets)} sheets of {file_path} to Parquet")
+    return manifest
+
+def find_sheet(manifest: Dict[str, Any], sheet_name: Union[int, str] = 0) -> Dict[str, Any]:
+    """Look up a sheet in a manifest by position or name."""
+    for sheet in manifest["sheets"]:
+        if sheet["index"] == sheet_name or sheet["name"] == sheet_name:
+            return sheet
+    raise ValueError(f"Sheet {sheet_name} not found in the workbook")
+
+def sheet_file_path(file_path: str, sheet: Dict[str, Any]) -> str:
+    """Return the path of a converted sheet."""
+    return os.path.join(_sheets_dir(file_path), sheet["file"])
+
+def remove_converted_sheets(file_path: str) -> None:
+    """Delete the Parquet copies of a workbook's sheets."""
+    shutil.rmtree(_sheets_dir(file_path), ignore_errors=True)
@@ -1,114 +1,200 @@
-import torch
-from ultralytics import YOLO
 import os
-from typing import List, Dict, Any, Optional
-import yaml
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Callable
 import logging
 from pathlib import Path
 import tempfile
-import shutil
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from services.model_registry import model_registry, DEFAULT_MODEL
+from services.inference_scheduler import inference_scheduler, InferenceQueueFull
+from services.detection_cache import detection_cache, detection_key
+from services.image_ingest import ingest_image, load_model_input
+from utils.file_handler import cached_file_sha256
+from utils.yaml_stream import iter_yaml_list
 
 logger = logging.getLogger(__name__)
 
+IMAGE_WORKERS = int(os.getenv("DATANIZE_IMAGE_WORKERS", "4"))
+# Image requests (decoding or awaiting detection) accepted at once before answering 429
+MAX_PENDING_IMAGES = int(os.getenv("DATANIZE_IMAGE_MAX_PENDING", "64"))
+
+IGNORED_LABELS = ['none', 'na', 'n/a']
+
+def is_ignored_label(label: Any) -> bool:
+    """Whether a label marks an object as not applicable: 'None', 'NA' or 'N/A'."""
+    return str(label).strip().lower() in IGNORED_LABELS
+
+def filter_ignored_labels(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop 'None', 'NA' and 'N/A' labels from an entry's detections and labels."""
+    filtered_entry = entry.copy()
+    # Filter in 'detections' if present
+    if 'detections' in filtered_entry:
+        filtered_entry['detections'] = [d for d in filtered_entry['detections'] if not is_ignored_label(d.get('label', ''))]
+    # Filter in 'labels' if present (for some formats this may be a dict)
+    if 'labels' in filtered_entry:
+        if isinstance(filtered_entry['labels'], dict):
+            filtered_entry['labels'] = {k: v for k, v in filtered_entry['labels'].items() if not is_ignored_label(v)}
+        elif isinstance(filtered_entry['labels'], list):
+            filtered_entry['labels'] = [l for l in filtered_entry['labels'] if not is_ignored_label(l)]
+    return filtered_entry
+
 class YOLOService:
-    def __init__(self):
-        self.model: Optional[YOLO] = None
-        self.detections_cache = {}
-        self.model_path = 'yolov8n.pt'
-        self.max_cache_size = 1000  # Maximum number of images to cache
+    def __init__(self, image_workers: int = IMAGE_WORKERS, max_pending: int = MAX_PENDING_IMAGES):
+        self.detections_cache = detection_cache
+        self.model_path = DEFAULT_MODEL
+        # Image hashing, decoding and upload writes stay off the pool the tabular routes share
+        self.executor = ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix="image-work")
+        self.max_pending = max_pending
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    def _admit(self) -> None:
+        """Reserve a slot for one image request, or raise InferenceQueueFull when all are taken."""
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise InferenceQueueFull(f"{self.max_pending} image requests are already in progress")
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def run_image_task(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run image work on the image executor, refusing it when too many requests are in progress."""
+        self._admit()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self._release()
+
+    @property
+    def model(self):
+        """The shared YOLO model, loaded on first use."""
+        return model_registry.get(self.model_path)
 
     def ensure_model_loaded(self):
         """Ensure the YOLO model is loaded."""
-        if self.model is None:
-            try:
-                logger.info("Loading YOLO model...")
-                self.model = YOLO(self.model_path)
-                logger.info("YOLO model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load YOLO model: {str(e)}")
-                raise RuntimeError(f"Failed to load YOLO model: {str(e)}")
+        model_registry.get(inference_scheduler.model_source())
+
+    @property
+    def backend(self) -> str:
+        """The inference backend: "torch", "onnx" or "onnx-int8"."""
+        return inference_scheduler.backend
+
+    @backend.setter
+    def backend(self, backend: str) -> None:
+        inference_scheduler.set_backend(backend)
+
+    def cache_key(self, content_hash: str) -> str:
+        return detection_key(content_hash, inference_scheduler.namespace)
+
+    def cached_detections(self, content_hash: str) -> Optional[List[Dict[str, Any]]]:
+        """Return detections already computed for an image with this content, if any."""
+        return self.detections_cache.get(self.cache_key(content_hash))
+
+    def _store_detections(self, key: str, done: Future) -> None:
+        """Cache a finished detection on the image executor, keeping SQLite writes off the inference worker."""
+        if done.cancelled() or done.exception() is not None:
+            return
+        try:
+            self.executor.submit(self.detections_cache.put, key, done.result())
+        except RuntimeError:
+            # The executor is shutting down; the detection is simply not cached
+            pass
+
+    def submit_detection(self, image: Any, content_hash: Optional[str] = None, block: bool = True,
+                         check_cache: bool = True) -> Future:
+        """Queue an image (path, array or PIL image) for batched detection.
+
+        When the image's content hash is given, cached detections are returned
+        without running the model and new ones are cached. Callers that have
+        just looked the hash up (as ``prepare`` does) pass ``check_cache`` False
+        to skip the second lookup. With ``block`` False a full inference queue
+        raises InferenceQueueFull instead of waiting.
+        """
+        if content_hash is None:
+            return inference_scheduler.submit(image, block=block)
+
+        key = self.cache_key(content_hash)
+        if check_cache:
+            cached = self.detections_cache.get(key)
+            if cached is not None:
+                future: Future = Future()
+                future.set_result(cached)
+                return future
+
+        future = inference_scheduler.submit(image, block=block)
+        future.add_done_callback(lambda done: self._store_detections(key, done))
+        return future
+
+    def prepare(self, image_path: str) -> Tuple[str, Optional[np.ndarray], Optional[List[Dict[str, Any]]]]:
+        """Hash an image and, unless its detections are cached, ingest it into model-sized pixels.
+
+        Returns the content hash with either the pixels to detect on or the
+        cached detections.
+        """
+        if not os.path.exists(image_path):
+            raise ValueError(f"Image file not found: {image_path}")
+        content_hash = cached_file_sha256(image_path)
+        cached = self.cached_detections(content_hash)
+        if cached is not None:
+            return content_hash, None, cached
+        ingested = ingest_image(image_path, inference_scheduler.image_size, content_hash)
+        return content_hash, load_model_input(ingested), None
 
     def detect_objects(self, image_path: str) -> List[Dict[str, Any]]:
-        """Detect objects in an image using YOLO."""
+        """Detect objects in an image using YOLO, batched with concurrent requests."""
         try:
-            # Validate image path
-            if not os.path.exists(image_path):
-                raise ValueError(f"Image file not found: {image_path}")
-
-            # Check if results are cached
-            if image_path in self.detections_cache:
-                return self.detections_cache[image_path]
-
-            # Ensure model is loaded
-            self.ensure_model_loaded()
-
-            # Perform detection
-            results = self.model(image_path)
-            
-            # Process results
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    try:
-                        # Get normalized coordinates (as percentages)
-                        x1, y1, x2, y2 = box.xyxyn[0].tolist()
-                        
-                        detection = {
-                            'label': result.names[int(box.cls[0])],
-                            'confidence': float(box.conf[0]),
-                            'bbox': [
-                                float(x1) * 100,  # Convert to percentage
-                                float(y1) * 100,
-                                float(x2) * 100,
-                                float(y2) * 100
-                            ]
-                        }
-                        detections.append(detection)
-                    except Exception as e:
-                        logger.warning(f"Error processing detection box: {str(e)}")
-                        continue
-
-            # Manage cache size
-            if len(self.detections_cache) >= self.max_cache_size:
-                # Remove oldest entries
-                oldest_keys = list(self.detections_cache.keys())[:100]
-                for key in oldest_keys:
-                    self.detections_cache.pop(key)
-
-            # Cache the results
-            self.detections_cache[image_path] = detections
-            return detections
+            content_hash, pixels, cached = self.prepare(image_path)
+            if cached is not None:
+                return cached
+            return self.submit_detection(pixels, content_hash, check_cache=False).result()
+        except Exception as e:
+            logger.error(f"Error detecting objects in image {image_path}: {str(e)}")
+            raise ValueError(f"Failed to detect objects: {str(e)}")
 
+    async def detect_objects_async(self, image_path: str) -> List[Dict[str, Any]]:
+        """Detect objects in an image without blocking the event loop.
+
+        Raises InferenceQueueFull rather than queueing when the service is
+        saturated, so callers can shed load.
+        """
+        self._admit()
+        try:
+            content_hash, pixels, cached = await asyncio.get_event_loop().run_in_executor(
+                self.executor, self.prepare, image_path
+            )
+            if cached is not None:
+                return cached
+            return await asyncio.wrap_future(self.submit_detection(pixels, content_hash, block=False, check_cache=False))
+        except InferenceQueueFull:
+            raise
         except Exception as e:
             logger.error(f"Error detecting objects in image {image_path}: {str(e)}")
             raise ValueError(f"Failed to detect objects: {str(e)}")
+        finally:
+            self._release()
 
-    def save_to_yaml(self, output_path: str, data: List[Dict[str, Any]]) -> None:
-        """Save detection and label data to YAML file, filtering out 'None', 'NA', or 'N/A' labels."""
+    def save_to_yaml(self, output_path: str, data: Iterable[Dict[str, Any]]) -> None:
+        """Save detection and label data to YAML file, filtering out 'None', 'NA', or 'N/A' labels.
+
+        Entries are filtered and written a chunk at a time, so ``data`` may be
+        a generator over more entries than fit in memory.
+        """
         try:
-            # Filter out objects with label 'None', 'NA', or 'N/A' in each image's detections/labels
-            filtered_data = []
-            for entry in data:
-                filtered_entry = entry.copy()
-                # Filter in 'detections' if present
-                if 'detections' in filtered_entry:
-                    filtered_entry['detections'] = [d for d in filtered_entry['detections'] if d.get('label', '').strip().lower() not in ['none', 'na', 'n/a']]
-                # Filter in 'labels' if present (for some formats this may be a dict)
-                if 'labels' in filtered_entry:
-                    if isinstance(filtered_entry['labels'], dict):
-                        filtered_entry['labels'] = {k: v for k, v in filtered_entry['labels'].items() if str(v).strip().lower() not in ['none', 'na', 'n/a']}
-                    elif isinstance(filtered_entry['labels'], list):
-                        filtered_entry['labels'] = [l for l in filtered_entry['labels'] if str(l).strip().lower() not in ['none', 'na', 'n/a']]
-                filtered_data.append(filtered_entry)
-            # Create a temporary file first
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.yaml') as temp_file:
-                yaml.dump(filtered_data, temp_file, default_flow_style=False)
-                temp_path = temp_file.name
             # Create the directory if it doesn't exist
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            # Move the temporary file to the final location
-            shutil.move(temp_path, output_path)
+            # Write next to the target so the final rename is atomic
+            with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.yaml',
+                                             dir=os.path.dirname(output_path)) as temp_file:
+                temp_path = temp_file.name
+                for chunk in iter_yaml_list(filter_ignored_labels(entry) for entry in data):
+                    temp_file.write(chunk)
+            os.replace(temp_path, output_path)
         except Exception as e:
             logger.error(f"Error saving YAML file: {str(e)}")
             # Clean up temporary file if it exists
@@ -123,5 +209,9 @@ class YOLOService:
         """Clear the detections cache."""
         self.detections_cache.clear()
 
+    def shutdown(self) -> None:
+        """Stop the image executor."""
+        self.executor.shutdown(wait=False)
+
 # Initialize the YOLO service
 yolo_service = YOLOService() 
\ No newline at end of file
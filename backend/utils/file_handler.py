@@ -1,10 +1,72 @@
 import os
+import asyncio
+import hashlib
 import shutil
+import threading
+from concurrent.futures import Executor
+from typing import Dict, Tuple, Optional
+
+import aiofiles
 from fastapi import UploadFile
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def save_upload_async(file: UploadFile, path: str, executor: Optional[Executor] = None) -> int:
+    """Stream an upload to disk in chunks without blocking the event loop; returns the bytes written.
+
+    Both reads of the spooled upload and writes run on ``executor`` when given.
+    """
+    loop = asyncio.get_event_loop()
+    written = 0
+    async with aiofiles.open(path, "wb", executor=executor) as out:
+        while True:
+            if executor is not None:
+                chunk = await loop.run_in_executor(executor, file.file.read, UPLOAD_CHUNK_SIZE)
+            else:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await out.write(chunk)
+            written += len(chunk)
+    return written
+
 def save_uploaded_file(file: UploadFile):
     os.makedirs("uploads", exist_ok=True)
     file_path = os.path.join("uploads", file.filename)
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
-    return file_path
\ No newline at end of file
+    return file_path
+
+def file_version(file_path: str) -> str:
+    """Identify a file version by its size and modification time."""
+    stat = os.stat(file_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file in chunks without parsing it."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+MAX_HASH_ENTRIES = 4096
+
+# Content hashes keyed by path and invalidated when the file's size or mtime changes
+_hashes: Dict[str, Tuple[str, str]] = {}
+_hashes_lock = threading.Lock()
+
+def cached_file_sha256(path: str) -> str:
+    """Hash a file, reusing the last hash while its size and mtime are unchanged."""
+    version = file_version(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    digest = file_sha256(path)
+    with _hashes_lock:
+        if len(_hashes) >= MAX_HASH_ENTRIES:
+            _hashes.clear()
+        _hashes[path] = (version, digest)
+    return digest
@@ -0,0 +1,120 @@
+import os
+import mimetypes
+from typing import Tuple, Optional, Iterator
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+
+from utils.file_handler import cached_file_sha256
+
+READ_CHUNK_SIZE = 64 * 1024
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be served for the file's size."""
+
+def file_etag(path: str) -> str:
+    """Return a strong ETag derived from the file's content hash."""
+    return f'"{cached_file_sha256(path)}"'
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single byte range into inclusive (start, end) offsets.
+
+    Returns None when the whole file should be sent: no header, a malformed
+    header, or several ranges, which servers are allowed to ignore.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            # An empty file has no last bytes to send
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+
+    if end is None:
+        end = size - 1
+    elif start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+def iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Read the inclusive byte range [start, end] of a file in chunks."""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+async def file_response(request: Request, path: str, filename: Optional[str] = None,
+                        media_type: Optional[str] = None) -> Response:
+    """Serve a file with strong ETags, conditional GET and single byte-range support."""
+    etag = await run_in_threadpool(file_etag, path)
+    size = os.path.getsize(path)
+    if media_type is None:
+        media_type = mimetypes.guess_type(filename or path)[0] or "application/octet-stream"
+
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # A Range is only honoured when If-Range (if sent) still names this version
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
@@ -0,0 +1,64 @@
+import os
+import logging
+import threading
+from typing import Optional, Dict, Any, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = int(os.getenv("DATANIZE_HTTP_POOL_SIZE", "16"))
+HTTP_RETRIES = int(os.getenv("DATANIZE_HTTP_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_READ_TIMEOUT = 60.0
+DEFAULT_TIMEOUT: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Every remote fetch (remote cache, streamed CSV reads) runs on a worker thread,
+# so one pooled synchronous session serves them all; no async client is kept
+_session: Optional[requests.Session] = None
+_client_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Return the shared pooled session, with keep-alive, retries and backoff."""
+    global _session
+    if _session is None:
+        with _client_lock:
+            if _session is None:
+                retry = Retry(
+                    total=HTTP_RETRIES,
+                    backoff_factor=HTTP_BACKOFF_FACTOR,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def open_stream(url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Start a streaming GET on the shared session. Use the response as a context manager."""
+    return get_session().get(url, headers=headers, stream=True, timeout=DEFAULT_TIMEOUT)
+
+def read_remote_csv(url: str, **read_csv_kwargs: Any) -> pd.DataFrame:
+    """Parse a remote CSV straight from the response stream, without buffering the body."""
+    with open_stream(url) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return pd.read_csv(response.raw, **read_csv_kwargs)
+
+def close_http_clients() -> None:
+    """Close the shared session and its pooled connections."""
+    global _session
+    with _client_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
@@ -1,2 +1,161 @@
-def auto_label_images(folder_path):
-    return {"yaml_path": "labels.yaml"}
\ No newline at end of file
+import os
+import json
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Iterator, Optional
+
+from services.yolo_service import yolo_service
+from utils.yaml_stream import YamlListWriter
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
+DECODE_WORKERS = int(os.getenv("DATANIZE_LABEL_DECODE_WORKERS", "4"))
+# Images decoded or awaiting detection at once; bounds memory on large folders
+MAX_IN_FLIGHT = int(os.getenv("DATANIZE_LABEL_MAX_IN_FLIGHT", "32"))
+# Limits on an uploaded archive, so a zip bomb cannot fill the disk
+MAX_ARCHIVE_IMAGES = int(os.getenv("DATANIZE_LABEL_MAX_ARCHIVE_IMAGES", "10000"))
+MAX_ARCHIVE_BYTES = int(os.getenv("DATANIZE_LABEL_MAX_ARCHIVE_BYTES", str(2 * 1024 ** 3)))
+
+def is_image_file(path: str) -> bool:
+    return Path(path).suffix.lower() in IMAGE_EXTENSIONS
+
+def list_images(folder_path: str, exclude: Iterable[str] = ()) -> List[str]:
+    """Return every image under a folder, in a stable order, skipping hidden and excluded directories."""
+    excluded = {os.path.realpath(path) for path in exclude}
+    images = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs[:] = sorted(
+            name for name in dirs
+            if not name.startswith('.') and os.path.realpath(os.path.join(root, name)) not in excluded
+        )
+        for name in sorted(files):
+            if is_image_file(name) and not name.startswith('.'):
+                images.append(os.path.join(root, name))
+    return images
+
+def extract_images(zip_path: str, target_dir: str) -> List[str]:
+    """Extract the images of a zip archive into one flat directory and return their paths.
+
+    Raises ValueError when the archive holds more than ``MAX_ARCHIVE_IMAGES``
+    images or more than ``MAX_ARCHIVE_BYTES`` uncompressed.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    paths = []
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            member for member in archive.infolist()
+            if not member.is_dir() and is_image_file(os.path.basename(member.filename))
+            and not os.path.basename(member.filename).startswith('.')
+        ]
+        if len(members) > MAX_ARCHIVE_IMAGES:
+            raise ValueError(f"Archive contains more than {MAX_ARCHIVE_IMAGES} images")
+        if sum(member.file_size for member in members) > MAX_ARCHIVE_BYTES:
+            raise ValueError(f"Archive images exceed {MAX_ARCHIVE_BYTES} bytes uncompressed")
+
+        # Declared sizes can lie, so the bytes actually written are counted too
+        written = 0
+        for member in members:
+            # Flatten the archive and keep names unique; this also rules out path traversal
+            target = os.path.join(target_dir, f"{len(paths)}_{os.path.basename(member.filename)}")
+            with archive.open(member) as source, open(target, "wb") as f:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > MAX_ARCHIVE_BYTES:
+                        raise ValueError(f"Archive images exceed {MAX_ARCHIVE_BYTES} bytes uncompressed")
+                    f.write(chunk)
+            paths.append(target)
+    return paths
+
+def _copy_outcome(source: Future, target: Future) -> None:
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+def _start_labelling(pool: ThreadPoolExecutor, image_path: str) -> Future:
+    """Hash and ingest an image on the pool, then queue it for batched detection; return the detections' future."""
+    labelled: Future = Future()
+
+    def on_prepared(prepared: Future) -> None:
+        try:
+            content_hash, pixels, cached = prepared.result()
+            if cached is not None:
+                labelled.set_result(cached)
+                return
+            detection = yolo_service.submit_detection(pixels, content_hash, check_cache=False)
+        except Exception as e:
+            labelled.set_exception(e)
+            return
+        detection.add_done_callback(lambda finished: _copy_outcome(finished, labelled))
+
+    pool.submit(yolo_service.prepare, image_path).add_done_callback(on_prepared)
+    return labelled
+
+def iter_auto_labels(image_paths: List[str], yaml_path: str, base_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Label images and yield each result as soon as it is ready.
+
+    Images are hashed and ingested on a thread pool and queued for batched
+    detection, with at most ``MAX_IN_FLIGHT`` in memory at once; images whose
+    content was labelled before skip decoding and inference. Results are appended to
+    ``yaml_path`` as they arrive; a final summary is yielded last.
+    """
+    writer = YamlListWriter(yaml_path)
+    labelled = failed = 0
+    paths = iter(image_paths)
+    in_flight: Dict[Future, str] = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="image-decode") as pool:
+            def fill() -> None:
+                for image_path in paths:
+                    in_flight[_start_labelling(pool, image_path)] = image_path
+                    if len(in_flight) >= MAX_IN_FLIGHT:
+                        return
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    image_path = in_flight.pop(future)
+                    name = os.path.relpath(image_path, base_dir) if base_dir else os.path.basename(image_path)
+                    try:
+                        detections = future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.warning(f"Failed to label {image_path}: {str(e)}")
+                        yield {"image_path": name, "error": str(e)}
+                        continue
+
+                    labelled += 1
+                    writer.write({"image_path": name, "detections": detections})
+                    yield {"image_path": name, "detections": detections}
+                fill()
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+    logger.info(f"Auto-labelled {labelled} images ({failed} failed) into {yaml_path}")
+    yield {"done": True, "yaml_path": yaml_path, "labelled": labelled, "failed": failed}
+
+def iter_ndjson(events: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode results as newline-delimited JSON."""
+    for event in events:
+        yield (json.dumps(event) + "\n").encode("utf-8")
+
+def auto_label_images(folder_path: str, yaml_path: Optional[str] = None) -> Dict[str, Any]:
+    """Label every image in a folder and write the detections to a YAML file."""
+    if not os.path.isdir(folder_path):
+        raise ValueError(f"Folder not found: {folder_path}")
+    yaml_path = yaml_path or os.path.join(folder_path, "labels.yaml")
+    summary = {}
+    for event in iter_auto_labels(list_images(folder_path), yaml_path, base_dir=folder_path):
+        if event.get("done"):
+            summary = event
+    return {"yaml_path": yaml_path, "labelled": summary.get("labelled", 0), "failed": summary.get("failed", 0)}
@@ -0,0 +1,85 @@
+import os
+import json
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+import yaml
+
+# libyaml's emitter when PyYAML was built with it, the pure-Python one otherwise
+YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Entries emitted per dump call; large enough to amortise the emitter setup
+EXPORT_CHUNK_ENTRIES = 256
+
+def dump_yaml(data: Any, stream=None, **options: Any) -> Optional[str]:
+    """Safe-dump data with the fastest dumper available, in block style by default."""
+    options.setdefault("default_flow_style", False)
+    options.setdefault("allow_unicode", True)
+    return yaml.dump(data, stream, Dumper=YamlDumper, **options)
+
+def _chunks(entries: Iterable[Any], size: int) -> Iterator[list]:
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_yaml_list(entries: Iterable[Dict[str, Any]], sort_keys: bool = True,
+                   chunk_entries: int = EXPORT_CHUNK_ENTRIES) -> Iterator[bytes]:
+    """Encode entries as one YAML list, a chunk at a time, without holding the whole document.
+
+    Block-style lists dumped one after another concatenate into a single
+    list, so the output loads exactly like ``dump_yaml(list(entries))``.
+    """
+    empty = True
+    for chunk in _chunks(entries, chunk_entries):
+        empty = False
+        yield dump_yaml(chunk, sort_keys=sort_keys).encode("utf-8")
+    if empty:
+        yield b"[]\n"
+
+def iter_yaml_mapping(entries: Iterable[tuple], indent: int = 0, sort_keys: bool = True,
+                      chunk_entries: int = EXPORT_CHUNK_ENTRIES) -> Iterator[str]:
+    """Encode (key, value) pairs as the body of a YAML mapping, nested ``indent`` spaces deep."""
+    prefix = " " * indent
+    for chunk in _chunks(entries, chunk_entries):
+        text = dump_yaml(dict(chunk), sort_keys=sort_keys, indent=2)
+        if prefix:
+            text = "".join(prefix + line for line in text.splitlines(True))
+        yield text
+
+def iter_json_list(entries: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode entries as one JSON array, an element at a time."""
+    yield b"["
+    first = True
+    for entry in entries:
+        yield (("" if first else ",") + "\n" + json.dumps(entry)).encode("utf-8")
+        first = False
+    yield b"\n]\n"
+
+class YamlListWriter:
+    """Append entries to a YAML list on disk one at a time."""
+
+    def __init__(self, output_path: str):
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        self.output_path = output_path
+        self.temp_path = f"{output_path}.tmp"
+        self._file = open(self.temp_path, "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        # Each one-item list dumped in turn concatenates into a single YAML list
+        dump_yaml([entry], self._file, sort_keys=False)
+        self.count += 1
+
+    def close(self) -> None:
+        if self.count == 0:
+            self._file.write("[]\n")
+        self._file.close()
+        os.replace(self.temp_path, self.output_path)
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
@@ -0,0 +1,72 @@
+import io
+import os
+import zipfile
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+# Formats that are already compressed gain nothing from deflate
+STORED_EXTENSIONS = {'.gz', '.zip', '.parquet', '.xlsx', '.pptx', '.png', '.jpg', '.jpeg', '.gif', '.webp'}
+DEFAULT_COMPRESSLEVEL = 6
+READ_CHUNK_SIZE = 64 * 1024
+
+class _ZipBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _iter_file(path: str) -> Iterator[bytes]:
+    """Read a file in fixed-size chunks."""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            yield chunk
+
+def should_store(arcname: str) -> bool:
+    """Return whether an entry should be stored rather than deflated, based on its format."""
+    name = arcname.lower()
+    return any(name.endswith(extension) for extension in STORED_EXTENSIONS)
+
+def iter_zip(entries: Iterable[Dict[str, Any]], compresslevel: int = DEFAULT_COMPRESSLEVEL) -> Iterator[bytes]:
+    """Build a zip archive on the fly and yield it piece by piece.
+
+    Each entry is a dict with an ``arcname`` and either a ``path`` on disk or
+    ``chunks``, an iterable of bytes. ``compresslevel`` may be overridden per
+    entry, and ``store`` forces or disables store-only mode; by default
+    already-compressed formats are stored. Nothing is written to disk.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+        for entry in entries:
+            arcname = entry["arcname"]
+            store = entry.get("store")
+            if store is None:
+                store = should_store(arcname)
+            zipf.compression = zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED
+            zipf.compresslevel = None if store else entry.get("compresslevel", compresslevel)
+
+            chunks = entry["chunks"] if "chunks" in entry else _iter_file(entry["path"])
+            with zipf.open(arcname, "w", force_zip64=True) as dest:
+                for chunk in chunks:
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+def file_entry(path: str, arcname: Optional[str] = None, **options) -> Dict[str, Any]:
+    """Describe a file on disk as a zip entry."""
+    return {"arcname": arcname or os.path.basename(path), "path": path, **options}